@@ -1,29 +1,32 @@
 import streamlit as st
 st.set_page_config(page_title="MedGlow", layout="wide", initial_sidebar_state="expanded")
 
-from pymongo import MongoClient
 from passlib.context import CryptContext
 from apscheduler.schedulers.background import BackgroundScheduler
-from datetime import datetime, date
-from dotenv import load_dotenv
-import os, time
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from datetime import datetime, date, timedelta
+import time
 import pandas as pd
 from bson import ObjectId
 
-load_dotenv()
-
-MONGO_URI = os.getenv("MONGO_URI", "").strip()
-DB_NAME = os.getenv("DB_NAME", "medglow_db")
-MAIL_HOST = os.getenv("MAIL_HOST", "smtp.gmail.com")
-MAIL_PORT = int(os.getenv("MAIL_PORT", 587))
-MAIL_USER = os.getenv("MAIL_USER", "")
-MAIL_PASS = os.getenv("MAIL_PASS", "")
-MAIL_FROM = os.getenv("MAIL_FROM", MAIL_USER)
-
-pwd_ctx = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# reminders.py puts the repo root on sys.path, so it must come before the utils imports.
+from reminders import ReminderService, connect, REMINDER_WORKER
+from utils.user_cache import user_cache, prefs_update
+from utils.inbox import Inbox, TOAST_LIMIT
+from utils import adherence, metrics
+from utils.outbox import outbox_key
+from utils.indexes import should_verify
+from utils.schedule import next_fire_at, floor_minute, expand_doses, rezone, zone, DEFAULT_TIMEZONE
+from zoneinfo import available_timezones
+from pymongo import UpdateOne
+from utils.leases import bucket_for
+from utils.settings import get_settings
+
+BCRYPT_ROUNDS = get_settings().bcrypt_rounds
+DATA_CACHE_TTL = get_settings().streamlit_data_cache_ttl
+NOTIFICATION_CACHE_TTL = get_settings().streamlit_notification_cache_ttl
+RECENT_DOSE_HOURS = 6
+
+pwd_ctx = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
 def hash_password(password: str) -> str:
     return pwd_ctx.hash(password)
@@ -34,128 +37,118 @@ def verify_password(password: str, hashed: str) -> bool:
     except Exception:
         return False
 
+def verify_and_update_password(password: str, hashed: str):
+    try:
+        return pwd_ctx.verify_and_update(password, hashed)
+    except Exception:
+        return False, None
+
+# Users without a stored zone follow the server's; picking this keeps it that way.
+SERVER_ZONE_CHOICE = f"(server default: {DEFAULT_TIMEZONE or 'server clock'})"
+
+@st.cache_resource
+def timezone_choices():
+    return [SERVER_ZONE_CHOICE] + sorted(available_timezones())
+
+def timezone_index(name):
+    choices = timezone_choices()
+    return choices.index(name) if name in choices else 0
+
+def chosen_timezone(choice):
+    return None if choice == SERVER_ZONE_CHOICE else choice
+
 @st.cache_resource
 def get_db():
-    if not MONGO_URI:
-        raise ValueError("MONGO_URI not set in .env (must begin with mongodb:// or mongodb+srv://)")
-    client = MongoClient(MONGO_URI)
-    return client[DB_NAME]
+    return connect()
 
 try:
     db = get_db()
     users_col = db["users"]
     presc_col = db["prescriptions"]
     med_col = db["medicines"]
-    notes_col = db["notifications"]
+    inbox = Inbox(db)
 except Exception as e:
     db = None
-    users_col = presc_col = med_col = notes_col = None
+    users_col = presc_col = med_col = inbox = None
 
-def send_email(to_email: str, subject: str, html_body: str) -> bool:
-    if not (MAIL_USER and MAIL_PASS):
-        print("Mail credentials missing; skipping email send.")
-        return False
-    try:
-        msg = MIMEMultipart("alternative")
-        msg["Subject"] = subject
-        msg["From"] = MAIL_FROM
-        msg["To"] = to_email
-        part = MIMEText(html_body, "html")
-        msg.attach(part)
-
-        server = smtplib.SMTP(MAIL_HOST, MAIL_PORT, timeout=15)
-        server.ehlo()
-        server.starttls()
-        server.login(MAIL_USER, MAIL_PASS)
-        server.sendmail(MAIL_FROM, to_email, msg.as_string())
-        server.quit()
-        return True
-    except Exception as e:
-        print("Email send error:", e)
-        return False
+@st.cache_resource
+def data_versions():
+    # user id -> version; bumping it makes every cached read for that user miss.
+    return {}
 
-def create_notification_record(user_id, medicine_name, time_local, medicine_id=None, sent_email=False):
-    if notes_col is None:
-        return
-    rec = {
-        "user_id": user_id,
-        "medicine_id": medicine_id,
-        "medicine_name": medicine_name,
-        "time_local": time_local,
-        "read": False,
-        "sent_email": bool(sent_email),
-        "created_at": datetime.utcnow()
-    }
+def data_version(user_id):
+    return data_versions().get(str(user_id), 0)
+
+def invalidate_user_data(user_id):
+    versions = data_versions()
+    versions[str(user_id)] = versions.get(str(user_id), 0) + 1
+
+@st.cache_data(ttl=DATA_CACHE_TTL, max_entries=2000, show_spinner=False)
+def cached_medicines(user_key, version):
+    return list(med_col.find({"user_id": ObjectId(user_key)}).sort("created_at", -1))
+
+@st.cache_data(ttl=DATA_CACHE_TTL, max_entries=2000, show_spinner=False)
+def cached_prescriptions(user_key, version):
+    return list(presc_col.find({"user_id": ObjectId(user_key)}).sort("created_at", -1))
+
+@st.cache_data(ttl=NOTIFICATION_CACHE_TTL, max_entries=2000, show_spinner=False)
+def cached_unread(user_key, version):
+    return inbox.unread(ObjectId(user_key), TOAST_LIMIT)
+
+@st.cache_data(ttl=NOTIFICATION_CACHE_TTL, max_entries=2000, show_spinner=False)
+def cached_unread_count(user_key, version):
+    return inbox.unread_count(ObjectId(user_key))
+
+@st.cache_data(ttl=DATA_CACHE_TTL, max_entries=2000, show_spinner=False)
+def cached_adherence(user_key, version, days):
+    rows = db["adherence_daily"].find(adherence.rollup_query(ObjectId(user_key), days)).sort("day", 1)
+    return [adherence.summarize(r) for r in rows]
+
+@st.cache_data(ttl=DATA_CACHE_TTL, max_entries=2000, show_spinner=False)
+def cached_outcomes(user_key, version, keys):
+    return {o["_id"]: o["status"] for o in db["dose_outcomes"].find({"_id": {"$in": list(keys)}}, {"status": 1})}
+
+def user_medicines(user_id):
+    return cached_medicines(str(user_id), data_version(user_id))
+
+def user_prescriptions(user_id):
+    return cached_prescriptions(str(user_id), data_version(user_id))
+
+def unread_notifications(user_id):
+    return cached_unread(str(user_id), data_version(user_id))
+
+def user_adherence(user_id, days=14):
+    return cached_adherence(str(user_id), data_version(user_id), days)
+
+def dose_outcomes(user_id, keys):
+    return cached_outcomes(str(user_id), data_version(user_id), tuple(keys))
+
+def unread_notification_count(user_id):
+    return cached_unread_count(str(user_id), data_version(user_id))
+
+@st.cache_resource
+def get_reminder_service():
+    # Once per process: indexes and the worker identity for shard leases.
+    service = ReminderService(db, on_notify=invalidate_user_data)
     try:
-        notes_col.insert_one(rec)
+        service.prepare()
     except Exception as e:
-        print("Failed to insert notification record:", e)
+        print("Failed to prepare indexes:", e)
+        if should_verify():
+            raise
+    return service
 
+@st.cache_resource
 def get_scheduler():
-    if "scheduler" not in st.session_state:
-        sched = BackgroundScheduler()
-        sched.start()
-        st.session_state["scheduler"] = sched
-    return st.session_state["scheduler"]
-
-def check_reminders_and_notify():
-    if med_col is None or users_col is None:
-        print("DB not initialized - skipping reminder check.")
-        return
-    now = datetime.now()
-    time_now = now.strftime("%H:%M")
-    today_str = now.strftime("%Y-%m-%d")
-    try:
-        query = {
-            "times": time_now,
-            "start_date": {"$lte": today_str},
-            "end_date": {"$gte": today_str}
-        }
-        meds = med_col.find(query)
-        for m in meds:
-            user_id = m.get("user_id")
-            if not user_id:
-                continue
-            user = users_col.find_one({"_id": user_id})
-            if not user:
-                continue
-            email = user.get("email")
-            if not email:
-                
-                pass
-            pref = user.get("notification_pref", "email")
-            subject = f"MedGlow Reminder — {m.get('name')}"
-            html = (
-                f"<p>Hi {user.get('name')},</p>"
-                f"<p>This is a reminder to take your medicine:</p>"
-                f"<h3>{m.get('name')}</h3>"
-                f"<p><strong>Dosage:</strong> {m.get('dosage')}</p>"
-                f"<p><strong>Time:</strong> {time_now}</p>"
-                f"<p>— MedGlow</p>"
-            )
-
-            sent = False
-            if pref in ["email", "both"]:
-                if email:
-                    sent = send_email(email, subject, html)
-            
-            if pref in ["popup", "both"]:
-                create_notification_record(user_id=user_id, medicine_name=m.get("name"), time_local=time_now, medicine_id=m.get("_id"), sent_email=sent)
-            else:
-               
-                if sent:
-                    create_notification_record(user_id=user_id, medicine_name=m.get("name"), time_local=time_now, medicine_id=m.get("_id"), sent_email=sent)
-            if notes_col is not None:
-                
-                pass
-            print(f"Reminder processed for user={user.get('email')} med={m.get('name')} pref={pref} sent_email={sent}")
-    except Exception as e:
-        print("Reminder job error:", e)
+    # One scheduler per server process, however many browser sessions are open.
+    sched = BackgroundScheduler()
+    get_reminder_service().schedule(sched)
+    sched.start()
+    metrics.start_exporter()
+    return sched
 
-if db is not None:
-    sched = get_scheduler()
-    if not any(j.id == "reminder_job" for j in sched.get_jobs()):
-        sched.add_job(check_reminders_and_notify, "interval", minutes=1, id="reminder_job", next_run_time=datetime.now())
+if db is not None and REMINDER_WORKER != "external":
+    get_scheduler()
 
 SIDEBAR_CSS = """
 <style>
@@ -263,6 +256,7 @@ def signup_ui():
     email = st.text_input("Email", key="su_email")
     password = st.text_input("Password", type="password", key="su_pass")
     notif_pref = st.selectbox("Notification Preference", ["email", "popup", "both"], index=0, key="su_notif")
+    tz_name = st.selectbox("Time zone", timezone_choices(), index=timezone_index(None), key="su_tz")
     if st.button("Create account", key="su_btn"):
         if not (name and email and password):
             st.warning("Please fill all fields.")
@@ -271,6 +265,8 @@ def signup_ui():
         else:
             hashed = hash_password(password)
             doc = {"name": name, "email": email, "password": hashed, "notification_pref": notif_pref}
+            if chosen_timezone(tz_name):
+                doc["timezone"] = tz_name
             if users_col is not None:
                 res = users_col.insert_one(doc)
                 st.success("Account created. Redirecting to login...")
@@ -293,14 +289,19 @@ def login_ui():
             st.error("Database not configured. Check MONGO_URI in .env.")
         else:
             user = users_col.find_one({"email": email})
+            ok, new_hash = verify_and_update_password(password, user["password"]) if user else (False, None)
+            if ok and new_hash:
+                users_col.update_one({"_id": user["_id"]}, {"$set": {"password": new_hash}})
             if not user:
                 st.error("No user found with that email.")
-            elif verify_password(password, user["password"]):
+            elif ok:
                 st.session_state["user"] = {
                     "_id": user["_id"],
                     "name": user["name"],
                     "email": user["email"],
-                    "notification_pref": user.get("notification_pref", "email")
+                    "notification_pref": user.get("notification_pref", "email"),
+                    "timezone": user.get("timezone"),
+                    "digest": user.get("digest", False)
                 }
                 st.success(f"Welcome {user['name']}! Redirecting to dashboard...")
                 st.session_state["page"] = "dashboard"
@@ -320,57 +321,82 @@ def dashboard_ui():
     st.markdown("<div class='main-content slide-in-left'>", unsafe_allow_html=True)
     st.header(f"Welcome, {st.session_state['user']['name']}")
     # Show unread in-app notifications as toast (non-blocking)
-    if notes_col is not None:
+    if inbox is not None:
+        user_id = st.session_state["user"]["_id"]
         try:
-            unread = list(notes_col.find({
-                "user_id": st.session_state["user"]["_id"],
-                "read": False
-            }).sort("created_at", -1))
+            unread = unread_notifications(user_id)
+            total = unread_notification_count(user_id) if unread else 0
         except Exception as e:
-            unread = []
+            unread, total = [], 0
             print("Failed to fetch notifications:", e)
-        for n in unread:
-            msg = f"Reminder: {n.get('medicine_name','Medicine')} — {n.get('time_local','')}"
+        msgs = [f"Reminder: {n.get('medicine_name','Medicine')} — {n.get('time_local','')}" for n in unread]
+        if total > len(unread):
+            msgs.append(f"…and {total - len(unread)} more reminders")
+        for msg in msgs:
             try:
                 st.toast(msg, icon="🔔")
             except Exception:
                 # fallback if st.toast isn't available
                 st.info(msg)
+        if unread:
             try:
-                notes_col.update_one({"_id": n["_id"]}, {"$set": {"read": True}})
+                # Up to the newest one shown, so a reminder that lands meanwhile stays unread.
+                inbox.acknowledge(user_id, before=unread[0]["created_at"])
             except Exception as e:
-                print("Failed to mark notification read:", e)
+                print("Failed to mark notifications read:", e)
+            invalidate_user_data(user_id)
 
     st.subheader("Upcoming reminders (next 24 hours)")
-    today = date.today().strftime("%Y-%m-%d")
     meds = []
     if med_col is not None:
         try:
-            meds = list(med_col.find({"user_id": st.session_state["user"]["_id"]}))
+            meds = user_medicines(st.session_state["user"]["_id"])
         except Exception as e:
             meds = []
             print("Failed to fetch medicines:", e)
-    now = datetime.now()
-    now_minutes = now.hour * 60 + now.minute
-    upcoming = []
-    for m in meds:
-        if m.get("start_date") and m.get("end_date"):
-            if not (m["start_date"] <= today <= m["end_date"]):
-                continue
-        for t in m.get("times", []):
-            try:
-                hh, mm = [int(x) for x in t.split(":")]
-                minutes = hh * 60 + mm
-                delta = minutes - now_minutes
-                if -60 <= delta <= 24*60:
-                    upcoming.append({"name": m["name"], "time": t, "dosage": m.get("dosage","")})
-            except:
-                continue
-    if upcoming:
-        for u in sorted(upcoming, key=lambda x: x["time"]):
-            st.info(f"⏱ {u['time']} — {u['name']} — {u['dosage']}")
+    now = floor_minute(datetime.utcnow())
+    doses = expand_doses(meds, now, now + timedelta(hours=24))
+    if not doses.empty:
+        today = datetime.now(zone(st.session_state["user"].get("timezone"))).date()
+        for d in doses.itertuples(index=False):
+            m = meds[d.med]
+            day = "" if d.local.date() == today else "Tomorrow "
+            st.info(f"⏱ {day}{d.local.strftime('%H:%M')} — {m['name']} — {m.get('dosage','')}")
     else:
         st.success("No reminders for the next 24 hours.")
+
+    st.subheader("Recent doses")
+    recent = expand_doses(meds, now - timedelta(hours=RECENT_DOSE_HOURS), now + timedelta(minutes=1))
+    if recent.empty:
+        st.caption(f"No doses in the last {RECENT_DOSE_HOURS} hours.")
+    else:
+        user_id = st.session_state["user"]["_id"]
+        keys = [outbox_key(meds[d.med]["_id"], d.at.to_pydatetime()) for d in recent.itertuples(index=False)]
+        outcomes = dose_outcomes(user_id, keys)
+        for d, key in zip(recent.itertuples(index=False), keys):
+            m = meds[d.med]
+            cols = st.columns([4, 1, 1, 1])
+            cols[0].write(f"{d.local.strftime('%H:%M')} — {m['name']} — {outcomes.get(key, 'no answer yet')}")
+            for col, status in zip(cols[1:], adherence.STATUSES):
+                if col.button(status.title(), key=f"dose:{status}:{key}"):
+                    try:
+                        adherence.record_sync(db, m, d.at.to_pydatetime(), status)
+                        invalidate_user_data(user_id)
+                        st.rerun()
+                    except Exception as e:
+                        st.error("Failed to record dose.")
+                        print("Record dose error:", e)
+
+    st.subheader("Adherence (last 14 days)")
+    try:
+        days = user_adherence(st.session_state["user"]["_id"])
+    except Exception as e:
+        days = []
+        print("Failed to fetch adherence:", e)
+    if days:
+        st.bar_chart(pd.DataFrame(days).set_index("day")[["taken", "skipped", "snoozed", "missed"]])
+    else:
+        st.caption("No doses recorded yet.")
     st.markdown("</div>", unsafe_allow_html=True)
 
 def add_prescription_ui():
@@ -393,6 +419,7 @@ def add_prescription_ui():
             if presc_col is not None:
                 try:
                     presc_col.insert_one(doc)
+                    invalidate_user_data(doc["user_id"])
                     st.success("Saved.")
                 except Exception as e:
                     st.error("Failed to save prescription.")
@@ -431,9 +458,14 @@ def add_medicine_ui():
                 "user_id": st.session_state["user"]["_id"],
                 "created_at": datetime.utcnow()
             }
+            if st.session_state["user"].get("timezone"):
+                med_doc["timezone"] = st.session_state["user"]["timezone"]
+            med_doc["next_fire_at"] = next_fire_at(med_doc, floor_minute(datetime.utcnow()))
+            med_doc["bucket"] = bucket_for(med_doc["user_id"])
             if med_col is not None:
                 try:
                     med_col.insert_one(med_doc)
+                    invalidate_user_data(med_doc["user_id"])
                     st.success("Medicine saved.")
                 except Exception as e:
                     st.error("Failed to save medicine.")
@@ -450,7 +482,7 @@ def view_prescriptions_ui():
         st.markdown("</div>", unsafe_allow_html=True)
         return
     try:
-        rows = list(presc_col.find({"user_id": st.session_state["user"]["_id"]}).sort("created_at", -1))
+        rows = user_prescriptions(st.session_state["user"]["_id"])
     except Exception as e:
         rows = []
         print("Fetch prescriptions error:", e)
@@ -469,7 +501,7 @@ def view_medicines_ui():
         st.markdown("</div>", unsafe_allow_html=True)
         return
     try:
-        rows = list(med_col.find({"user_id": st.session_state["user"]["_id"]}).sort("created_at", -1))
+        rows = user_medicines(st.session_state["user"]["_id"])
     except Exception as e:
         rows = []
         print("Fetch medicines error:", e)
@@ -499,11 +531,33 @@ def notification_settings_ui():
     except Exception:
         idx = 0
     new_pref = st.radio("Choose how you want reminders:", choices, index=idx, key="notif_choice")
+    new_digest = st.checkbox("Combine reminders due at the same time into one email", value=user.get("digest", False), key="notif_digest")
+    tz_index = timezone_index(user.get("timezone"))
+    tz_choice = st.selectbox("Time zone", timezone_choices(), index=tz_index, key="notif_tz")
+    new_tz = chosen_timezone(tz_choice)
     if st.button("Save Settings", key="save_notif"):
         if users_col is not None:
             try:
-                users_col.update_one({"_id": user["_id"]}, {"$set": {"notification_pref": new_pref}})
+                update = {"$set": {"notification_pref": new_pref, "digest": new_digest}}
+                # The zone is only written when it was actually changed; saving other settings leaves it alone.
+                tz_changed = tz_choice != timezone_choices()[tz_index]
+                if tz_changed and new_tz:
+                    update["$set"]["timezone"] = new_tz
+                elif tz_changed:
+                    update["$unset"] = {"timezone": ""}
+                users_col.update_one({"_id": user["_id"]}, prefs_update(update))
+                if tz_changed:
+                    # Medicine times are wall-clock times, so every pending dose moves with the zone.
+                    now = floor_minute(datetime.utcnow())
+                    updates = [UpdateOne({"_id": m["_id"]}, {"$set": rezone(m, new_tz, now)})
+                               for m in med_col.find({"user_id": user["_id"]}, {"times": 1, "start_date": 1, "end_date": 1})]
+                    if updates:
+                        med_col.bulk_write(updates, ordered=False)
+                user_cache.invalidate(user["_id"])
+                invalidate_user_data(user["_id"])
                 st.session_state["user"]["notification_pref"] = new_pref
+                st.session_state["user"]["timezone"] = new_tz
+                st.session_state["user"]["digest"] = new_digest
                 st.success("Updated notification preference.")
                 st.experimental_rerun()
             except Exception as e:
@@ -524,8 +578,8 @@ with st.sidebar:
         
         try:
             unread_count = 0
-            if notes_col is not None:
-                unread_count = notes_col.count_documents({"user_id": st.session_state["user"]["_id"], "read": False})
+            if inbox is not None:
+                unread_count = unread_notification_count(st.session_state["user"]["_id"])
         except Exception:
             unread_count = 0
         st.markdown(f"<div style='margin-bottom:12px;color:#eafff4'>Signed in: <b>{st.session_state['user']['name']}</b></div>", unsafe_allow_html=True)
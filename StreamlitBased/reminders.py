@@ -0,0 +1,167 @@
+from datetime import datetime
+from dotenv import load_dotenv
+from pymongo import MongoClient
+import os, sys, time
+
+# Before the utils imports, so a .env next to this app is in the environment
+# by the time get_settings() first reads it.
+load_dotenv()
+
+# Shared helpers live at the repo root next to the FastAPI backend.
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from utils.user_cache import resolve_users_sync
+from utils.mailer import get_pool
+from utils.inbox import Inbox
+from utils.outbox import enqueue_sync, drain_sync
+from utils.digest import reminder_entries, log_savings
+from utils.catchup import catch_up_sync
+from utils.backfill import backfill_reminder_fields_sync
+from utils import metrics
+from utils.indexes import ensure_indexes_sync, verify_query_plans_sync, should_verify
+from utils.schedule import local_hhmm
+from utils.leases import ShardLeasesSync, RENEW_SECONDS, bucket_filter
+from utils.settings import get_settings
+
+settings = get_settings()
+MONGO_URI = settings.streamlit_mongo_uri
+DB_NAME = settings.streamlit_db_name
+MAIL_HOST = settings.streamlit_mail_host
+MAIL_PORT = settings.mail_port
+MAIL_USER = settings.streamlit_mail_user
+MAIL_PASS = settings.streamlit_mail_pass
+MAIL_FROM = settings.streamlit_mail_from
+MAIL_POOL_SIZE = settings.mail_pool_size
+REMINDER_WORKER = settings.streamlit_reminder_worker
+TICK_SECONDS = 60
+DELIVER_SECONDS = settings.reminder_deliver_seconds
+
+def connect():
+    if not MONGO_URI:
+        raise ValueError("MONGO_URI not set in .env (must begin with mongodb:// or mongodb+srv://)")
+    client = MongoClient(MONGO_URI, event_listeners=[metrics.command_timer])
+    return client[DB_NAME]
+
+def get_mailer():
+    return get_pool(MAIL_HOST, MAIL_PORT, MAIL_USER, MAIL_PASS, MAIL_FROM, size=MAIL_POOL_SIZE)
+
+def mail_configured():
+    return bool(MAIL_USER and MAIL_PASS)
+
+
+class ReminderService:
+    """The reminder jobs for one process; `on_notify(user_id)` runs after a notification is written."""
+
+    def __init__(self, db, on_notify=None):
+        self.db = db
+        self.users_col = db["users"]
+        self.med_col = db["medicines"]
+        self.inbox = Inbox(db)
+        self.outbox_col = db["reminder_outbox"]
+        self.leases = ShardLeasesSync(db)
+        self.on_notify = on_notify
+
+    def prepare(self):
+        # Once per process: the shared index registry. Reminder fields for old rows are
+        # filled in by the one-off backfill_job that schedule() adds.
+        ensure_indexes_sync(self.db)
+        if should_verify():
+            verify_query_plans_sync(self.db)
+
+    def backfill(self):
+        backfill_reminder_fields_sync(self.db)
+
+    def schedule(self, sched):
+        self.renew_leases()
+        sched.add_job(self.backfill, id="backfill_job", replace_existing=True)
+        sched.add_job(self.renew_leases, "interval", seconds=RENEW_SECONDS, id="lease_job", replace_existing=True)
+        sched.add_job(self.check_reminders_and_notify, "interval", seconds=TICK_SECONDS, id="reminder_job",
+                      next_run_time=datetime.now(), replace_existing=True)
+        sched.add_job(self.deliver_reminders, "interval", seconds=DELIVER_SECONDS, id="outbox_job",
+                      max_instances=1, replace_existing=True)
+
+    def create_notification_record(self, user_id, medicine_name, time_local, medicine_id=None, sent_email=False, scheduled_at=None):
+        rec = {
+            "user_id": user_id,
+            "medicine_id": medicine_id,
+            "medicine_name": medicine_name,
+            "time_local": time_local,
+            "scheduled_at": scheduled_at,
+            "read": False,
+            "sent_email": bool(sent_email),
+            "created_at": datetime.utcnow()
+        }
+        try:
+            # Only a new record moves the unread counter; a re-run tick changes nothing.
+            if self.inbox.add(rec) and self.on_notify:
+                self.on_notify(user_id)
+        except Exception as e:
+            print("Failed to insert notification record:", e)
+
+    def renew_leases(self):
+        try:
+            self.leases.refresh()
+        except Exception as e:
+            print("Lease refresh error:", e)
+
+    def check_reminders_and_notify(self):
+        if not self.leases.owned:
+            return
+        started = time.perf_counter()
+        due = 0
+        try:
+            due = catch_up_sync(self.db, self.notify_due, buckets=bucket_filter(self.leases.owned))
+        except Exception as e:
+            print("Reminder job error:", e)
+        metrics.observe_tick(time.perf_counter() - started, due, TICK_SECONDS)
+
+    def notify_due(self, meds):
+        users = resolve_users_sync(self.users_col, [m.get("user_id") for m in meds])
+        pending = []
+        for m in meds:
+            user_id = m.get("user_id")
+            if not user_id:
+                continue
+            user = users.get(user_id)
+            if not user:
+                continue
+            email = user.get("email")
+            pref = user.get("notification_pref", "email")
+            scheduled_at = m["next_fire_at"]
+
+            # Email goes through the outbox; its record is written once delivery settles.
+            if pref in ["email", "both"] and email and mail_configured():
+                pending.append((m, user))
+            elif pref in ["popup", "both"]:
+                time_local = local_hhmm(scheduled_at, m.get("timezone"))
+                self.create_notification_record(user_id=user_id, medicine_name=m.get("name"), time_local=time_local, medicine_id=m.get("_id"), sent_email=False, scheduled_at=scheduled_at)
+            print(f"Reminder queued for user={user.get('email')} med={m.get('name')} pref={pref}")
+
+        entries = reminder_entries(pending)
+        log_savings(len(pending), entries)
+        enqueue_sync(self.outbox_col, entries)
+
+    def record_outbox_result(self, entry, sent):
+        # A digest entry carries several doses; each still gets its own in-app record.
+        doses = entry.get("medicines") or [{"medicine_id": entry["medicine_id"], "medicine_name": entry.get("medicine_name")}]
+        for dose in doses:
+            if sent or entry.get("pref") == "both":
+                self.create_notification_record(user_id=entry["user_id"], medicine_name=dose["medicine_name"], time_local=entry.get("time_local"), medicine_id=dose["medicine_id"], sent_email=sent, scheduled_at=entry["scheduled_at"])
+            print(f"Reminder processed for user={entry.get('to')} med={dose['medicine_name']} pref={entry.get('pref')} sent_email={sent}")
+
+    def deliver_reminders(self):
+        if not mail_configured() or not self.leases.owned:
+            return
+        try:
+            buckets = bucket_filter(self.leases.owned)
+            drain_sync(
+                self.outbox_col,
+                get_mailer().submit,
+                on_sent=lambda e: self.record_outbox_result(e, True),
+                on_dead=lambda e: self.record_outbox_result(e, False),
+                match={"bucket": buckets} if buckets is not None else None,
+            )
+        except Exception as e:
+            print("Outbox job error:", e)
@@ -0,0 +1,25 @@
+"""Standalone reminder worker: run `python StreamlitBased/worker.py` and start the UI with REMINDER_WORKER=external."""
+from apscheduler.schedulers.blocking import BlockingScheduler
+
+from reminders import ReminderService, connect
+from utils import metrics
+
+
+def main():
+    service = ReminderService(connect())
+    service.prepare()
+    sched = BlockingScheduler()
+    service.schedule(sched)
+    metrics.start_exporter(metrics.METRICS_PORT or 9105)
+    print(f"Reminder worker {service.leases.worker_id} started")
+    try:
+        sched.start()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        # Hand the shards back now instead of waiting for the lease to expire.
+        service.leases.release()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""SMTP sends and render time for one reminder tick, with and without digest mode.
+
+Run from the repo root:  python benchmarks/digest_sends.py [users] [medicines_per_user]
+
+Every user has all their medicines due in the same minute (the 08:00
+morning round). Each outbox entry is one SMTP transaction, so the entry
+count is the number of sends the tick costs.
+"""
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId
+from utils.digest import reminder_entries
+
+
+def due_pairs(users, per_user, digest):
+    at = datetime(2030, 1, 1, 8, 0)
+    pairs = []
+    for u in range(users):
+        user = {"_id": ObjectId(), "name": f"Patient {u}", "email": f"p{u}@example.com", "digest": digest}
+        for m in range(per_user):
+            med = {"_id": ObjectId(), "user_id": user["_id"], "name": f"Medicine {m}", "dosage": "1 tablet",
+                   "next_fire_at": at, "bucket": 0, "timezone": "UTC"}
+            pairs.append((med, user))
+    return pairs
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    per_user = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    print(f"{users} users x {per_user} medicines due at 08:00")
+    for label, digest in [("per dose", False), ("digest", True)]:
+        pairs = due_pairs(users, per_user, digest)
+        started = time.perf_counter()
+        entries = reminder_entries(pairs)
+        elapsed = time.perf_counter() - started
+        size = sum(len(e["html"]) for e in entries)
+        print(f"{label:>9}: {len(entries):6d} SMTP sends  render {elapsed * 1000:7.1f}ms  "
+              f"{size / 1024:8.1f} KiB of HTML")
+
+
+if __name__ == "__main__":
+    main()
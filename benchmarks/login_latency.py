@@ -0,0 +1,59 @@
+"""Event-loop lag while concurrent logins verify passwords.
+
+Run from the repo root:  python benchmarks/login_latency.py [concurrent_logins]
+
+Compares verifying inline in the coroutine (the old login handler) with
+utils.auth.verify_and_update_async. A probe task sleeps 5 ms in a loop and
+records how late it wakes up; that lateness is what every other request
+on the loop would see.
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.auth import pwd_context, verify_and_update_async, BCRYPT_ROUNDS, PASSWORD_WORKERS
+
+PROBE_INTERVAL = 0.005
+
+
+async def probe(lags, stop):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(time.perf_counter() - started - PROBE_INTERVAL)
+
+
+async def inline_login(password, hashed):
+    return pwd_context.verify_and_update(password, hashed)
+
+
+async def run(login, logins, password, hashed):
+    lags, stop = [], asyncio.Event()
+    probe_task = asyncio.create_task(probe(lags, stop))
+    await asyncio.sleep(0.05)
+    started = time.perf_counter()
+    await asyncio.gather(*[login(password, hashed) for _ in range(logins)])
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe_task
+    lags.sort()
+    return elapsed, statistics.median(lags), lags[int(len(lags) * 0.99) - 1], lags[-1]
+
+
+def main():
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    password = "correct horse battery staple"
+    hashed = pwd_context.hash(password)
+    print(f"{logins} concurrent logins, bcrypt rounds={BCRYPT_ROUNDS}, workers={PASSWORD_WORKERS}")
+    for label, login in [("inline", inline_login), ("executor", verify_and_update_async)]:
+        elapsed, p50, p99, worst = asyncio.run(run(login, logins, password, hashed))
+        print(f"{label:>9}: total {elapsed:6.2f}s  loop lag p50 {p50 * 1000:7.1f}ms  "
+              f"p99 {p99 * 1000:7.1f}ms  max {worst * 1000:7.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""CPU time to serialize one large /medicine/all page.
+
+Run from the repo root:  python benchmarks/serialization.py [items]
+
+  encoder:  FastAPI's default path, jsonable_encoder then json.dumps, on whole documents
+            (given an ObjectId encoder; without one it raises on user_id)
+  json:     json.dumps(default=str) on projected documents (the response cache before)
+  to_json:  pydantic_core.to_json on documents projected to MedicineOut's fields (now)
+  validate: MedicinePage.model_validate(...).model_dump_json(), for comparison
+"""
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from pydantic_core import to_json
+from model.medicine import MedicineOut, MedicinePage
+from utils.pagination import projection
+
+ROUNDS = 50
+
+
+def full_doc():
+    return {
+        "_id": ObjectId(), "prescription_id": str(ObjectId()), "name": "Amoxicillin", "dosage": "500mg",
+        "frequency": 3, "times": ["08:00", "14:00", "20:00"], "start_date": "2026-01-01",
+        "end_date": "2026-01-14", "user_id": ObjectId(), "created_at": datetime.utcnow(),
+        "next_fire_at": datetime.utcnow(), "bucket": 17, "timezone": "Europe/London",
+    }
+
+
+def page(docs):
+    items = []
+    for d in docs:
+        d = dict(d)
+        d["id"] = str(d.pop("_id"))
+        items.append(d)
+    return {"items": items, "next_cursor": "NjVhYmM"}
+
+
+def cpu(fn):
+    started = time.process_time()
+    for _ in range(ROUNDS):
+        body = fn()
+    return (time.process_time() - started) / ROUNDS, len(body)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    fields = set(projection(MedicineOut)) | {"_id"}
+    full = [full_doc() for _ in range(n)]
+    projected = [{k: v for k, v in d.items() if k in fields} for d in full]
+
+    runs = [
+        ("encoder", lambda: json.dumps(jsonable_encoder(page(full), custom_encoder={ObjectId: str})).encode()),
+        ("json", lambda: json.dumps(page(projected), default=str).encode()),
+        ("to_json", lambda: to_json(page(projected), fallback=str)),
+        ("validate", lambda: MedicinePage.model_validate(page(projected)).model_dump_json().encode()),
+    ]
+    print(f"{n} medicines per page, {ROUNDS} rounds")
+    for label, fn in runs:
+        seconds, size = cpu(fn)
+        print(f"{label:>8}: {seconds * 1000:7.2f}ms CPU per response  {size / 1024:7.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,55 @@
 from motor.motor_asyncio import AsyncIOMotorClient
-from dotenv import load_dotenv
-import os
+from utils import indexes
+from utils.metrics import command_timer
+from utils.settings import get_settings
+import asyncio
 
-load_dotenv()
 
-MONGO_URL = os.getenv("MONGO_URL")
+class Database:
+    """The app's Motor database. The client is opened by `connect()` in the app lifespan and
+    released by `close()`; until then collection access raises instead of dialling at import."""
 
-client = AsyncIOMotorClient(MONGO_URL)
-db = client["medical_app"]   
+    def __init__(self):
+        self.client = None
+        self._db = None
+
+    def connect(self):
+        if self.client is None:
+            settings = get_settings()
+            self.client = AsyncIOMotorClient(
+                settings.mongo_url,
+                appname="medical-app",
+                event_listeners=[command_timer],
+                **settings.mongo_options()
+            )
+            self._db = self.client[settings.db_name]
+        return self._db
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+        self.client = None
+        self._db = None
+
+    async def ping(self, timeout=None):
+        await asyncio.wait_for(self.connect().command("ping"), timeout or get_settings().ready_timeout)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if self._db is None:
+            raise RuntimeError(f"database not connected (looked up {name!r}); it is opened in the app lifespan")
+        return getattr(self._db, name)
+
+    def __getitem__(self, name):
+        if self._db is None:
+            raise RuntimeError(f"database not connected (looked up {name!r}); it is opened in the app lifespan")
+        return self._db[name]
+
+
+db = Database()
+
+async def ensure_indexes():
+    await indexes.ensure_indexes(db)
+    if indexes.should_verify():
+        await indexes.verify_query_plans(db)
@@ -115,19 +115,33 @@ async function saveMed() {
     alert("Medicine Saved!");
 }
 
-/* ----------------- LOAD PRESCRIPTIONS ----------------- */
-async function loadPrescriptions() {
+/* ----------------- PAGED LISTS ----------------- */
+async function fetchPages(path, onPage) {
     const token = localStorage.getItem("token");
+    let cursor = null;
+
+    do {
+        const url = cursor
+            ? `${BASE_URL}${path}?cursor=${encodeURIComponent(cursor)}`
+            : `${BASE_URL}${path}`;
+        const r = await fetch(url, {
+            headers: { "Authorization": `Bearer ${token}` }
+        });
+        if (r.status === 401) {
+            logout();
+            return;
+        }
+        const page = await r.json();
+        onPage(page.items);
+        cursor = page.next_cursor;
+    } while (cursor);
+}
 
-    const r = await fetch(`${BASE_URL}/prescriptions/`, {
-        headers: { "Authorization": `Bearer ${token}` }
-    });
-
-    const data = await r.json();
-
+/* ----------------- LOAD PRESCRIPTIONS ----------------- */
+async function loadPrescriptions() {
     const table = document.getElementById("prescriptionTable");
 
-    data.forEach(p => {
+    await fetchPages("/prescriptions/", items => items.forEach(p => {
         table.innerHTML += `
             <tr>
                 <td>${p.title}</td>
@@ -136,22 +150,14 @@ async function loadPrescriptions() {
                 <td>${p.medicines.length}</td>
             </tr>
         `;
-    });
+    }));
 }
 
 /* ----------------- LOAD MEDICINES ----------------- */
 async function loadMedicines() {
-    const token = localStorage.getItem("token");
-
-    const r = await fetch(`${BASE_URL}/medicine/all`, {
-        headers: { "Authorization": `Bearer ${token}` }
-    });
-
-    const data = await r.json();
-
     const table = document.getElementById("medicineTable");
 
-    data.forEach(m => {
+    await fetchPages("/medicine/all", items => items.forEach(m => {
         table.innerHTML += `
             <tr>
                 <td>${m.name}</td>
@@ -163,5 +169,5 @@ async function loadMedicines() {
                 <td>${m.prescription_id || "-"}</td>
             </tr>
         `;
-    });
+    }));
 }
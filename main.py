@@ -1,8 +1,43 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from routes import auth, prescription, reminder
+from routes import admin, auth, prescription, reminder
+from database import db, ensure_indexes
+from scheduler import ReminderScheduler
+from utils import metrics, timing
+from utils.email_config import mailer
+import time
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    db.connect()
+    app.state.reminder_scheduler = ReminderScheduler(db)
+    try:
+        await ensure_indexes()
+        await app.state.reminder_scheduler.start()
+        yield
+        await app.state.reminder_scheduler.stop()
+    finally:
+        # QUIT the pooled SMTP sessions rather than leaving the server to time them out.
+        mailer.close()
+        db.close()
+
+app = FastAPI(lifespan=lifespan)
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    spans = timing.begin()
+    started = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - started
+
+    # The route template, not the raw path, so ids don't explode the label set.
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    timing.route_stats.record(f"{request.method} {route}", elapsed)
+    metrics.HTTP_REQUEST_SECONDS.labels(request.method, route, response.status_code).observe(elapsed)
+    response.headers["Server-Timing"] = timing.server_timing(spans, elapsed)
+    return response
 
 
 app.add_middleware(
@@ -16,7 +51,24 @@ app.add_middleware(
 app.include_router(auth.router)
 app.include_router(prescription.router)
 app.include_router(reminder.router)
+app.include_router(admin.router)
 
 @app.get("/")
 def home():
     return {"message": "Medical App Backend Running"}
+
+@app.get("/ready", include_in_schema=False)
+async def ready():
+    # Liveness is "/"; this one fails while Mongo is unreachable so the balancer holds traffic.
+    try:
+        await db.ping()
+    except Exception as e:
+        # Driver errors name hosts and topology; that goes to the log, not to whoever can reach /ready.
+        print(f"Readiness check failed: {type(e).__name__}: {e}")
+        return JSONResponse({"status": "unavailable"}, status_code=503)
+    return {"status": "ready"}
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(body, media_type=content_type)
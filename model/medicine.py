@@ -1,5 +1,6 @@
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
+from datetime import datetime
 
 class MedicineCreate(BaseModel):
     prescription_id: str
@@ -9,3 +10,29 @@ class MedicineCreate(BaseModel):
     times: List[str]  # ["08:00", "14:00"]
     start_date: str
     end_date: str
+
+class MedicineOut(BaseModel):
+    id: str
+    prescription_id: Optional[str] = None
+    name: str
+    dosage: Optional[str] = None
+    frequency: Optional[int] = None
+    times: List[str] = []
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+
+class MedicinePage(BaseModel):
+    items: List[MedicineOut]
+    next_cursor: Optional[str] = None
+
+class UpcomingDose(BaseModel):
+    medicine_id: str
+    name: str
+    dosage: Optional[str] = None
+    at: str  # ISO-8601 UTC
+    time: str  # HH:MM in the medicine's zone
+
+class DoseEvent(BaseModel):
+    scheduled_at: datetime  # the dose instant, as returned by /medicine/upcoming
+    status: Literal["taken", "skipped", "snoozed"]
+    snooze_minutes: Optional[int] = Field(None, ge=1, le=24 * 60)
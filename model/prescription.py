@@ -1,7 +1,26 @@
 from pydantic import BaseModel
 from typing import Optional, List
+from model.medicine import MedicineOut
 
 class PrescriptionCreate(BaseModel):
     title: str
     doctor_name: Optional[str] = None
     date: str  # YYYY-MM-DD
+
+class PrescriptionOut(BaseModel):
+    id: str
+    title: str
+    doctor_name: Optional[str] = None
+    date: Optional[str] = None
+    medicines: List[str] = []  # medicine ids
+
+class PrescriptionPage(BaseModel):
+    items: List[PrescriptionOut]
+    next_cursor: Optional[str] = None
+
+class PrescriptionWithMedicines(PrescriptionOut):
+    medicines: List[MedicineOut] = []
+
+class PrescriptionWithMedicinesPage(BaseModel):
+    items: List[PrescriptionWithMedicines]
+    next_cursor: Optional[str] = None
@@ -1,10 +1,29 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, field_validator
+from typing import Literal, Optional
+from utils.schedule import valid_timezone
+
+def check_timezone(value):
+    if value is not None and not valid_timezone(value):
+        raise ValueError("Unknown time zone; use an IANA name such as Europe/London")
+    return value
 
 class UserCreate(BaseModel):
     name: str
     email: EmailStr
     password: str
+    timezone: Optional[str] = None
+
+    _timezone = field_validator("timezone")(check_timezone)
 
 class UserLogin(BaseModel):
     email: EmailStr
     password: str
+
+class TimezoneUpdate(BaseModel):
+    timezone: str
+
+    _timezone = field_validator("timezone")(check_timezone)
+
+class PreferencesUpdate(BaseModel):
+    notification_pref: Optional[Literal["email", "popup", "both"]] = None
+    digest: Optional[bool] = None
@@ -0,0 +1,49 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
+from utils.auth import require_admin
+from utils.profiler import SamplingProfiler, profile_lock, MAX_PROFILE_SECONDS
+from utils.timing import route_stats
+import asyncio
+
+router = APIRouter(prefix="/admin", tags=["Admin"], dependencies=[Depends(require_admin)])
+
+def collapsed_file(profiler, name):
+    return PlainTextResponse(
+        profiler.collapsed(),
+        headers={"Content-Disposition": f'attachment; filename="{name}.collapsed"'}
+    )
+
+def start_profile(interval_ms):
+    if not profile_lock.acquire(blocking=False):
+        raise HTTPException(409, "A profile is already running")
+    profiler = SamplingProfiler(interval_ms / 1000)
+    profiler.start()
+    return profiler
+
+def stop_profile(profiler):
+    profiler.stop()
+    profile_lock.release()
+
+@router.get("/timings")
+async def timings():
+    return route_stats.percentiles()
+
+@router.post("/profile")
+async def profile(seconds: float = Query(10, gt=0, le=MAX_PROFILE_SECONDS), interval_ms: int = Query(5, ge=1, le=100)):
+    # The loop keeps serving while we wait, so the samples show real traffic.
+    profiler = start_profile(interval_ms)
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        stop_profile(profiler)
+    return collapsed_file(profiler, "profile")
+
+@router.post("/profile/tick")
+async def profile_tick(request: Request, interval_ms: int = Query(1, ge=1, le=100)):
+    scheduler = request.app.state.reminder_scheduler
+    profiler = start_profile(interval_ms)
+    try:
+        await scheduler.tick()
+    finally:
+        stop_profile(profiler)
+    return collapsed_file(profiler, "reminder-tick")
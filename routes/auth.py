@@ -1,30 +1,74 @@
-from fastapi import APIRouter, HTTPException
-from model.user import UserCreate, UserLogin
-from utils.auth import hash_password, verify_password, create_token
+from fastapi import APIRouter, Depends, HTTPException
+from pymongo import UpdateOne
+from datetime import datetime
+from model.user import UserCreate, UserLogin, TimezoneUpdate, PreferencesUpdate
+from utils.auth import hash_password_async, verify_and_update_async, create_token, get_current_user
+from utils.schedule import rezone, floor_minute
+from utils.user_cache import user_cache, prefs_update
+from utils.cache import response_cache
+from utils.ratelimit import limiter, AUTH_IP_RATE, AUTH_IP_BURST, AUTH_EMAIL_RATE, AUTH_EMAIL_BURST
 from database import db
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
 
-@router.post("/signup")
+# Both routes cost a full bcrypt round, so they are limited before any of that work starts.
+@router.post("/signup", dependencies=[Depends(limiter.per_ip("signup-ip", AUTH_IP_RATE, AUTH_IP_BURST))])
 async def signup(user: UserCreate):
-    print("DEBUG PASSWORD RECEIVED:", user.password)  # <<< THIS LINE
+    await limiter.hit("signup-email", user.email.lower(), AUTH_EMAIL_RATE, AUTH_EMAIL_BURST)
 
     existing = await db.users.find_one({"email": user.email})
     if existing:
         raise HTTPException(400, "Email already registered")
 
-    hashed = hash_password(user.password)
+    hashed = await hash_password_async(user.password)
     user_dict = {"name": user.name, "email": user.email, "password": hashed}
+    if user.timezone:
+        user_dict["timezone"] = user.timezone
 
     await db.users.insert_one(user_dict)
     return {"message": "User created"}
 
 
-@router.post("/login")
+@router.post("/login", dependencies=[Depends(limiter.per_ip("login-ip", AUTH_IP_RATE, AUTH_IP_BURST))])
 async def login(data: UserLogin):
+    await limiter.hit("login-email", data.email.lower(), AUTH_EMAIL_RATE, AUTH_EMAIL_BURST)
     user = await db.users.find_one({"email": data.email})
-    if not user or not verify_password(data.password, user["password"]):
+    if not user:
         raise HTTPException(401, "Invalid credentials")
 
+    ok, new_hash = await verify_and_update_async(data.password, user["password"])
+    if not ok:
+        raise HTTPException(401, "Invalid credentials")
+    if new_hash:
+        await db.users.update_one({"_id": user["_id"]}, {"$set": {"password": new_hash}})
+
     token = create_token({"id": str(user["_id"]), "email": user["email"]})
     return {"token": token}
+
+
+@router.put("/timezone")
+async def set_timezone(data: TimezoneUpdate, user=Depends(get_current_user)):
+    await db.users.update_one({"_id": user["id"]}, prefs_update({"$set": {"timezone": data.timezone}}))
+    user_cache.invalidate(user["id"])
+
+    # Medicine times are wall-clock times, so every pending dose moves with the zone.
+    now = floor_minute(datetime.utcnow())
+    fields = {"times": 1, "start_date": 1, "end_date": 1}
+    updates = [
+        UpdateOne({"_id": m["_id"]}, {"$set": rezone(m, data.timezone, now)})
+        async for m in db.medicines.find({"user_id": user["id"]}, fields)
+    ]
+    if updates:
+        await db.medicines.bulk_write(updates, ordered=False)
+    await response_cache.invalidate_user(user["id"])
+    return {"timezone": data.timezone}
+
+
+@router.put("/preferences")
+async def set_preferences(data: PreferencesUpdate, user=Depends(get_current_user)):
+    # `digest` folds every reminder due in the same minute into one email.
+    changes = data.dict(exclude_none=True)
+    if changes:
+        await db.users.update_one({"_id": user["id"]}, prefs_update({"$set": changes}))
+        user_cache.invalidate(user["id"])
+    return changes
@@ -1,22 +1,98 @@
-from fastapi import APIRouter, HTTPException
-from model.prescription import PrescriptionCreate
+from fastapi import APIRouter, Body, Depends, File, HTTPException, Query, Request, UploadFile
+from fastapi.responses import StreamingResponse
+from model.prescription import PrescriptionCreate, PrescriptionOut, PrescriptionPage, PrescriptionWithMedicines, PrescriptionWithMedicinesPage
+from model.medicine import MedicineOut
 from database import db
 from bson import ObjectId
+from datetime import datetime
+from utils.auth import get_current_user
+from utils.pagination import paginate, paginate_pipeline, projection, stream_ndjson, to_public, DEFAULT_LIMIT, MAX_LIMIT
+from utils import bulk
+from utils.cache import response_cache
+from utils.ratelimit import write_slots, bulk_slots
 
 router = APIRouter(prefix="/prescriptions", tags=["Prescriptions"])
 
-@router.post("/")
-async def create_prescription(p: PrescriptionCreate):
+# Fields the frontend actually renders, as declared by the response model.
+PRESCRIPTION_FIELDS = projection(PrescriptionOut)
+
+# Joins each prescription to its medicines through the id strings in `medicines`,
+# matching on the medicines' _id index.
+WITH_MEDICINES = [
+    {"$addFields": {"medicine_ids": {"$map": {
+        "input": {"$ifNull": ["$medicines", []]},
+        "in": {"$convert": {"input": "$$this", "to": "objectId", "onError": None, "onNull": None}},
+    }}}},
+    {"$lookup": {
+        "from": "medicines",
+        "localField": "medicine_ids",
+        "foreignField": "_id",
+        "pipeline": [{"$project": {"_id": 0, "id": {"$toString": "$_id"}, **projection(MedicineOut)}}],
+        "as": "medicines",
+    }},
+    {"$project": projection(PrescriptionWithMedicines)},
+]
+
+def prescription_doc(p, user):
     prescription = p.dict()
     prescription["medicines"] = []
+    prescription["user_id"] = user["id"]
+    prescription["created_at"] = datetime.utcnow()
+    return prescription
+
+@router.post("/", dependencies=[Depends(write_slots)])
+async def create_prescription(p: PrescriptionCreate, user=Depends(get_current_user)):
+    prescription = prescription_doc(p, user)
 
     result = await db.prescriptions.insert_one(prescription)
+    await response_cache.invalidate_user(user["id"])
     return {"id": str(result.inserted_id)}
 
-@router.get("/")
-async def get_prescriptions():
-    pres = await db.prescriptions.find().to_list(100)
-    for p in pres:
-        p["id"] = str(p["_id"])
-        del p["_id"]
-    return pres
+async def import_prescriptions(rows, user):
+    valid, errors = bulk.validate_rows(rows, PrescriptionCreate)
+    inserted, failed = await bulk.insert_rows(db.prescriptions, [(i, prescription_doc(p, user)) for i, p in valid])
+    if inserted:
+        await response_cache.invalidate_user(user["id"])
+    return bulk.report(inserted, errors + failed)
+
+@router.post("/bulk", dependencies=[Depends(bulk_slots)])
+async def bulk_create_prescriptions(rows: list = Body(...), user=Depends(get_current_user)):
+    bulk.check_size(rows)
+    return await import_prescriptions(rows, user)
+
+@router.post("/bulk/csv", dependencies=[Depends(bulk_slots)])
+async def bulk_create_prescriptions_csv(file: UploadFile = File(...), user=Depends(get_current_user)):
+    return await import_prescriptions(await bulk.read_csv(file), user)
+
+@router.get("/", response_model=PrescriptionPage)
+async def get_prescriptions(request: Request, cursor: str = None, limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT), user=Depends(get_current_user)):
+    return await response_cache.respond(request, user["id"], lambda: paginate(
+        db.prescriptions, {"user_id": user["id"]}, PRESCRIPTION_FIELDS, cursor, limit
+    ), model=PrescriptionPage)
+
+@router.get("/export")
+async def export_prescriptions(user=Depends(get_current_user)):
+    return StreamingResponse(
+        stream_ndjson(db.prescriptions, {"user_id": user["id"]}, PrescriptionOut),
+        media_type="application/x-ndjson"
+    )
+
+@router.get("/with-medicines", response_model=PrescriptionWithMedicinesPage)
+async def get_prescriptions_with_medicines(request: Request, cursor: str = None, limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT), user=Depends(get_current_user)):
+    return await response_cache.respond(request, user["id"], lambda: paginate_pipeline(
+        db.prescriptions, {"user_id": user["id"]}, WITH_MEDICINES, cursor, limit
+    ), model=PrescriptionWithMedicinesPage)
+
+async def find_prescription(prescription_id, user):
+    if not ObjectId.is_valid(prescription_id):
+        raise HTTPException(404, "Prescription not found")
+    pipeline = [{"$match": {"_id": ObjectId(prescription_id), "user_id": user["id"]}}, *WITH_MEDICINES]
+    found = await db.prescriptions.aggregate(pipeline).to_list(1)
+    if not found:
+        raise HTTPException(404, "Prescription not found")
+    return to_public(found[0])
+
+@router.get("/{prescription_id}", response_model=PrescriptionWithMedicines)
+async def get_prescription(request: Request, prescription_id: str, user=Depends(get_current_user)):
+    return await response_cache.respond(request, user["id"], lambda: find_prescription(prescription_id, user),
+                                        model=PrescriptionWithMedicines)
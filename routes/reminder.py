@@ -1,26 +1,173 @@
-from fastapi import APIRouter
-from model.medicine import MedicineCreate
+from fastapi import APIRouter, Body, Depends, File, HTTPException, Query, Request, UploadFile
+from fastapi.responses import StreamingResponse
+from model.medicine import MedicineCreate, MedicineOut, MedicinePage, UpcomingDose, DoseEvent
+from typing import List
 from database import db
+from bson import ObjectId
+from pymongo import UpdateOne
+from datetime import datetime, timedelta, timezone
+from utils.schedule import next_fire_at, floor_minute, expand_doses
+from utils.leases import bucket_for
+from utils.auth import get_current_user
+from utils.user_cache import resolve_users
+from utils.pagination import paginate, projection, stream_ndjson, DEFAULT_LIMIT, MAX_LIMIT
+from utils import adherence, bulk
+from utils.cache import response_cache
+from utils.ratelimit import write_slots, bulk_slots
 
 router = APIRouter(prefix="/medicine", tags=["Medicine"])
 
-@router.post("/")
-async def add_medicine(m: MedicineCreate):
+# Fields the frontend actually renders, as declared by the response model.
+MEDICINE_FIELDS = projection(MedicineOut)
+# How far ahead of a dose it can be answered; later doses haven't come due yet.
+EARLY_DOSE_MINUTES = 15
+
+async def user_timezone(user):
+    users = await resolve_users(db.users, [user["id"]])
+    return users.get(user["id"], {}).get("timezone")
+
+def medicine_doc(m, user, timezone=None):
     medicine = m.dict()
+    medicine["user_id"] = user["id"]
+    if timezone:
+        medicine["timezone"] = timezone
+    medicine["created_at"] = datetime.utcnow()
+    medicine["next_fire_at"] = next_fire_at(medicine, floor_minute(datetime.utcnow()))
+    medicine["bucket"] = bucket_for(medicine.get("user_id"))
+    return medicine
+
+def prescription_oid(prescription_id):
+    # Prescriptions are keyed by ObjectId; the request carries its string form.
+    return ObjectId(prescription_id) if ObjectId.is_valid(prescription_id) else None
+
+@router.post("/", dependencies=[Depends(write_slots)])
+async def add_medicine(m: MedicineCreate, user=Depends(get_current_user)):
+    medicine = medicine_doc(m, user, await user_timezone(user))
     result = await db.medicines.insert_one(medicine)
 
     
     await db.prescriptions.update_one(
-        {"_id": m.prescription_id},
+        {"_id": prescription_oid(m.prescription_id), "user_id": user["id"]},
         {"$push": {"medicines": str(result.inserted_id)}}
     )
+    await response_cache.invalidate_user(user["id"])
 
     return {"id": str(result.inserted_id)}
 
-@router.get("/all")
-async def get_all():
-    meds = await db.medicines.find().to_list(100)
-    for m in meds:
-        m["id"] = str(m["_id"])
-        del m["_id"]
-    return meds
+async def import_medicines(rows, user):
+    valid, errors = bulk.validate_rows(rows, MedicineCreate)
+
+    # One lookup for every parent referenced, restricted to the caller's prescriptions.
+    wanted = {prescription_oid(m.prescription_id) for _, m in valid} - {None}
+    owned = set()
+    if wanted:
+        async for p in db.prescriptions.find({"_id": {"$in": list(wanted)}, "user_id": user["id"]}, {"_id": 1}):
+            owned.add(p["_id"])
+
+    docs = []
+    timezone = await user_timezone(user)
+    for i, m in valid:
+        if prescription_oid(m.prescription_id) in owned:
+            docs.append((i, medicine_doc(m, user, timezone)))
+        else:
+            errors.append({"row": i, "error": f"Unknown prescription {m.prescription_id}"})
+
+    inserted, failed = await bulk.insert_rows(db.medicines, docs)
+
+    links = {}
+    by_row = dict(docs)
+    for row, _id in inserted:
+        links.setdefault(prescription_oid(by_row[row]["prescription_id"]), []).append(str(_id))
+    if links:
+        await db.prescriptions.bulk_write([
+            UpdateOne({"_id": pid, "user_id": user["id"]}, {"$push": {"medicines": {"$each": ids}}})
+            for pid, ids in links.items()
+        ], ordered=False)
+        await response_cache.invalidate_user(user["id"])
+
+    return bulk.report(inserted, errors + failed)
+
+@router.post("/bulk", dependencies=[Depends(bulk_slots)])
+async def bulk_add_medicines(rows: list = Body(...), user=Depends(get_current_user)):
+    bulk.check_size(rows)
+    return await import_medicines(rows, user)
+
+@router.post("/bulk/csv", dependencies=[Depends(bulk_slots)])
+async def bulk_add_medicines_csv(file: UploadFile = File(...), user=Depends(get_current_user)):
+    return await import_medicines(await bulk.read_csv(file, list_fields=("times",)), user)
+
+@router.get("/all", response_model=MedicinePage)
+async def get_all(request: Request, cursor: str = None, limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT), user=Depends(get_current_user)):
+    return await response_cache.respond(request, user["id"], lambda: paginate(
+        db.medicines, {"user_id": user["id"]}, MEDICINE_FIELDS, cursor, limit
+    ), model=MedicinePage)
+
+@router.get("/upcoming", response_model=List[UpcomingDose])
+async def upcoming(hours: int = Query(24, ge=1, le=168), user=Depends(get_current_user)):
+    meds = await db.medicines.find({"user_id": user["id"]}, {**MEDICINE_FIELDS, "timezone": 1}).to_list(None)
+    now = floor_minute(datetime.utcnow())
+    doses = expand_doses(meds, now, now + timedelta(hours=hours))
+    return [
+        {
+            "medicine_id": str(meds[d.med]["_id"]),
+            "name": meds[d.med].get("name"),
+            "dosage": meds[d.med].get("dosage"),
+            "at": d.at.isoformat() + "Z",
+            "time": d.local.strftime("%H:%M"),
+        }
+        for d in doses.itertuples(index=False)
+    ]
+
+@router.post("/{medicine_id}/doses", dependencies=[Depends(write_slots)])
+async def record_dose(medicine_id: str, event: DoseEvent, user=Depends(get_current_user)):
+    if not ObjectId.is_valid(medicine_id):
+        raise HTTPException(404, "Medicine not found")
+    med = await db.medicines.find_one(
+        {"_id": ObjectId(medicine_id), "user_id": user["id"]},
+        {"user_id": 1, "times": 1, "start_date": 1, "end_date": 1, "timezone": 1}
+    )
+    if not med:
+        raise HTTPException(404, "Medicine not found")
+
+    at = event.scheduled_at
+    if at.tzinfo:
+        at = at.astimezone(timezone.utc).replace(tzinfo=None)
+    at = floor_minute(at)
+    if next_fire_at(med, at) != at:
+        raise HTTPException(400, "scheduled_at is not a dose of this medicine")
+    if at > floor_minute(datetime.utcnow()) + timedelta(minutes=EARLY_DOSE_MINUTES):
+        raise HTTPException(400, "scheduled_at is in the future")
+
+    extra = {"snooze_minutes": event.snooze_minutes} if event.snooze_minutes else {}
+    await adherence.record(db, med, at, event.status, **extra)
+    await response_cache.invalidate_user(user["id"])
+    return {"medicine_id": medicine_id, "scheduled_at": at.isoformat() + "Z", "status": event.status}
+
+async def adherence_report(user, days):
+    daily = await db.adherence_daily.find(adherence.rollup_query(user["id"], days)).sort("day", 1).to_list(None)
+    query = adherence.rollup_query(user["id"], days)
+    query["medicine_id"] = {"$ne": None}
+    per_medicine = {}
+    async for row in db.adherence_daily.find(query):
+        totals = per_medicine.setdefault(row["medicine_id"], {"day": "", "due": 0, "taken": 0, "skipped": 0, "snoozed": 0})
+        for k in ("due",) + adherence.STATUSES:
+            totals[k] += row.get(k, 0)
+    return {
+        "days": [adherence.summarize(row) for row in daily],
+        "medicines": [
+            {"medicine_id": str(mid), **{k: v for k, v in adherence.summarize(t).items() if k != "day"}}
+            for mid, t in per_medicine.items()
+        ],
+    }
+
+@router.get("/adherence")
+async def get_adherence(request: Request, days: int = Query(30, ge=1, le=366), user=Depends(get_current_user)):
+    # Reads the daily rollups only; raw dose events are never re-aggregated here.
+    return await response_cache.respond(request, user["id"], lambda: adherence_report(user, days))
+
+@router.get("/export")
+async def export_medicines(user=Depends(get_current_user)):
+    return StreamingResponse(
+        stream_ndjson(db.medicines, {"user_id": user["id"]}, MedicineOut),
+        media_type="application/x-ndjson"
+    )
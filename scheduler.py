@@ -1,53 +1,99 @@
-from apscheduler.schedulers.background import BackgroundScheduler
-from utils.database import medicine_collection, user_collection
 from datetime import datetime
-from utils.email_config import fm, MessageSchema
+from utils.email_config import mailer, MAIL_POOL_SIZE
+from utils.leases import ShardLeases, RENEW_SECONDS, bucket_filter
+from utils.outbox import enqueue, drain
+from utils.digest import reminder_entries, log_savings
+from utils.catchup import catch_up
+from utils.backfill import backfill_reminder_fields
+from utils import metrics
+from utils.user_cache import resolve_users
+import asyncio
+import time
+from utils.settings import get_settings
 
-scheduler = BackgroundScheduler()
+TICK_SECONDS = 60
+DELIVER_SECONDS = get_settings().reminder_deliver_seconds
 
 async def send_email(email, subject, body):
-    message = MessageSchema(
-        subject=subject,
-        recipients=[email],
-        body=body,
-        subtype="html"
-    )
-    await fm.send_message(message)
-
-async def check_reminders():
-    now = datetime.now()
-    current_time = now.strftime("%H:%M")
-    current_date = now.strftime("%Y-%m-%d")
-
-    medicines = medicine_collection.find({})
-
-    for med in medicines:
-        start = med["start_date"]
-        end = med["end_date"]
-
-        # Only valid dates
-        if not (start <= current_date <= end):
-            continue
-
-        # Check times like ["08:00", "14:00"]
-        for t in med["times"]:
-            if t == current_time:
-                user = user_collection.find_one({"_id": med["user_id"]})
-
-                if user:
-                    subject = f"Medicine Reminder: {med['name']}"
-                    body = f"""
-                    <h3>Hello {user['name']},</h3>
-                    <p>This is a reminder to take your medicine:</p>
-                    <h2>{med['name']}</h2>
-                    <p>Dosage: {med['dosage']}</p>
-                    <p>Frequency: {med['frequency']} times/day</p>
-                    <br>
-                    <p>Stay healthy ❤️</p>
-                    """
-
-                    await send_email(user["email"], subject, body)
-                    print(f"Email sent to {user['email']} for {med['name']}")
-
-scheduler.add_job(check_reminders, "interval", minutes=1)
-scheduler.start()
+    await mailer.send_async(email, subject, body)
+
+async def check_reminders(db, now=None, buckets=None):
+    async def handle(medicines):
+        users = await resolve_users(db.users, [m.get("user_id") for m in medicines])
+        pending = []
+        for med in medicines:
+            user = users.get(med.get("user_id"))
+            # Popup-only users see the dose in the app; only email and "both" get mail.
+            if user and user.get("email") and user.get("notification_pref", "email") != "popup":
+                pending.append((med, user))
+        entries = reminder_entries(pending)
+        log_savings(len(pending), entries)
+        await enqueue(db.reminder_outbox, entries)
+
+    return await catch_up(db, handle, now=now, buckets=buckets)
+
+async def deliver_reminders(db, buckets=None):
+    match = {"bucket": buckets} if buckets is not None else None
+    sent = await drain(db.reminder_outbox, send_email, concurrency=MAIL_POOL_SIZE, match=match)
+    if sent:
+        print(f"Outbox drained: {sent} reminder(s) attempted")
+    return sent
+
+
+class ReminderScheduler:
+    def __init__(self, db):
+        self.db = db
+        self.leases = ShardLeases(db)
+        self.tasks = []
+        self.last_tick = None
+
+    async def start(self):
+        await self.leases.refresh()
+        self.tasks = [
+            # In the background: a large legacy backfill must not hold up startup.
+            asyncio.create_task(self.backfill()),
+            asyncio.create_task(self._every(RENEW_SECONDS, self.renew)),
+            asyncio.create_task(self._every(TICK_SECONDS, self.tick, align=True)),
+            asyncio.create_task(self._every(DELIVER_SECONDS, self.deliver)),
+        ]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        await self.leases.release()
+
+    async def backfill(self):
+        try:
+            await backfill_reminder_fields(self.db)
+        except Exception as e:
+            print("Reminder backfill error:", e)
+
+    async def renew(self):
+        await self.leases.refresh()
+
+    async def tick(self):
+        if not self.leases.owned:
+            return
+        started = time.perf_counter()
+        due = await check_reminders(self.db, buckets=bucket_filter(self.leases.owned))
+        duration = time.perf_counter() - started
+        self.last_tick = {"at": datetime.utcnow(), "duration": duration, "due": due}
+        metrics.observe_tick(duration, due, TICK_SECONDS)
+        if duration > TICK_SECONDS:
+            print(f"Reminder tick overran: {duration:.1f}s for {due} due medicine(s)")
+
+    async def deliver(self):
+        if self.leases.owned:
+            await deliver_reminders(self.db, buckets=bucket_filter(self.leases.owned))
+
+    async def _every(self, interval, job, align=False):
+        # Runs once straight away so a restart catches up before the first boundary.
+        while True:
+            try:
+                await job()
+            except Exception as e:
+                print(f"Scheduler job {job.__name__} error:", e)
+            delay = interval - (time.time() % interval) if align else interval
+            await asyncio.sleep(delay)
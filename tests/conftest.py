@@ -0,0 +1,35 @@
+import asyncio
+import functools
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+from mongomock.collection import BulkOperationBuilder
+
+
+def _drop_sort(method):
+    # Newer pymongo passes `sort=` to bulk builders; mongomock predates it and never sorts anyway.
+    @functools.wraps(method)
+    def wrapper(self, *args, sort=None, **kwargs):
+        return method(self, *args, **kwargs)
+    return wrapper
+
+
+BulkOperationBuilder.add_update = _drop_sort(BulkOperationBuilder.add_update)
+BulkOperationBuilder.add_replace = _drop_sort(BulkOperationBuilder.add_replace)
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient()["test"]
+
+
+@pytest.fixture
+def adb():
+    motor = pytest.importorskip("mongomock_motor")
+    return motor.AsyncMongoMockClient()["test"]
+
+
+@pytest.fixture
+def run():
+    return lambda coro: asyncio.run(coro)
@@ -0,0 +1,24 @@
+import io
+
+import pytest
+from fastapi import HTTPException
+from starlette.datastructures import UploadFile
+
+from utils import bulk
+
+
+def upload(data, size=None):
+    return UploadFile(io.BytesIO(data), size=size)
+
+
+def test_rows_are_parsed_with_list_fields(run):
+    rows = run(bulk.read_csv(upload(b"\xef\xbb\xbfname,times\nAspirin, 08:00;20:00\n"), list_fields=("times",)))
+    assert rows == [{"name": "Aspirin", "times": ["08:00", "20:00"]}]
+
+
+@pytest.mark.parametrize("size", [None, bulk.MAX_CSV_BYTES + 1])
+def test_oversized_upload_is_refused_before_parsing(run, monkeypatch, size):
+    monkeypatch.setattr(bulk, "MAX_CSV_BYTES", 16)
+    with pytest.raises(HTTPException) as e:
+        run(bulk.read_csv(upload(b"name\n" + b"x\n" * 20, size=size)))
+    assert e.value.status_code == 413
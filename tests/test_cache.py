@@ -0,0 +1,30 @@
+import json
+
+from starlette.requests import Request
+
+from model.medicine import MedicinePage
+from utils.cache import LocalCache, ResponseCache
+
+
+def request(path="/medicine/all", headers=()):
+    return Request({"type": "http", "method": "GET", "path": path, "query_string": b"limit=2",
+                    "headers": [(k.encode(), v.encode()) for k, v in headers]})
+
+
+def test_fill_is_shaped_by_the_model_and_revalidates(run):
+    cache = ResponseCache(LocalCache())
+    calls = []
+
+    async def produce():
+        calls.append(1)
+        return {"items": [{"id": "m1", "name": "Aspirin", "frequency": "2", "next_fire_at": "internal"}],
+                "next_cursor": None}
+
+    first = run(cache.respond(request(), "u1", produce, model=MedicinePage))
+    item = json.loads(first.body)["items"][0]
+    assert item["frequency"] == 2 and "next_fire_at" not in item
+
+    again = run(cache.respond(request(headers=[("if-none-match", first.headers["etag"])]), "u1", produce,
+                              model=MedicinePage))
+    assert again.status_code == 304
+    assert len(calls) == 1
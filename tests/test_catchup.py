@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+
+from utils import catchup
+from utils.backfill import backfill_reminder_fields_sync
+
+NOW = datetime(2026, 10, 18, 12, 0)
+
+
+def medicine(_id="m1", fire_at=NOW - timedelta(minutes=1), times=("08:00", "11:59", "20:00")):
+    return {"_id": _id, "user_id": "u1", "bucket": 1, "times": list(times), "timezone": "UTC",
+            "start_date": "2026-10-01", "end_date": "2026-10-31", "next_fire_at": fire_at}
+
+
+def collect(into):
+    return lambda doses: into.extend((d["_id"], d["next_fire_at"]) for d in doses)
+
+
+def test_rerun_tick_is_a_noop(db):
+    db.medicines.insert_one(medicine())
+    handled = []
+
+    assert catchup.catch_up_sync(db, collect(handled), NOW) == 1
+    assert catchup.catch_up_sync(db, collect(handled), NOW) == 0
+
+    assert handled == [("m1", NOW - timedelta(minutes=1))]
+    assert db.medicines.find_one()["next_fire_at"] == datetime(2026, 10, 18, 20, 0)
+    assert db.dose_outcomes.count_documents({}) == 1
+    assert db.adherence_daily.find_one({"medicine_id": "m1"})["due"] == 1
+
+
+def test_stall_handles_each_missed_dose_but_drops_stale_ones(db):
+    db.medicines.insert_one(medicine(fire_at=datetime(2026, 10, 16, 20, 0)))
+    handled = []
+
+    due = catchup.catch_up_sync(db, collect(handled), NOW)
+
+    cutoff = NOW - timedelta(hours=catchup.CATCHUP_HOURS)
+    assert due == 6
+    assert handled and all(at >= cutoff for _, at in handled)
+    assert len(handled) == 3
+    assert db.medicines.find_one()["next_fire_at"] > NOW
+
+
+def test_advance_is_guarded_on_the_value_it_read(db):
+    db.medicines.insert_one(medicine())
+    moved = datetime(2026, 10, 19, 8, 0)
+
+    def handle(doses):
+        # Another tick (or an edit) moves the medicine while this one is mid-batch.
+        db.medicines.update_one({"_id": "m1"}, {"$set": {"next_fire_at": moved}})
+
+    catchup.catch_up_sync(db, handle, NOW)
+    assert db.medicines.find_one()["next_fire_at"] == moved
+
+
+def test_buckets_limit_the_tick(db):
+    db.medicines.insert_many([medicine(), {**medicine("m2"), "bucket": 2}])
+    handled = []
+
+    catchup.catch_up_sync(db, collect(handled), NOW, buckets={"$in": [2]})
+    assert [m for m, _ in handled] == ["m2"]
+    assert db.medicines.find_one({"_id": "m1"})["next_fire_at"] < NOW
+
+
+def test_async_rerun_tick_is_a_noop(adb, run):
+    handled = []
+
+    async def handle(doses):
+        collect(handled)(doses)
+
+    async def scenario():
+        await adb.medicines.insert_one(medicine())
+        first = await catchup.catch_up(adb, handle, NOW)
+        second = await catchup.catch_up(adb, handle, NOW)
+        return first, second, await adb.medicines.find_one()
+
+    first, second, med = run(scenario())
+    assert (first, second) == (1, 0)
+    assert len(handled) == 1
+    assert med["next_fire_at"] == datetime(2026, 10, 18, 20, 0)
+
+
+def test_backfill_fills_legacy_medicines_once(db):
+    legacy = {k: v for k, v in medicine("m1").items() if k not in ("next_fire_at", "bucket")}
+    db.medicines.insert_many([legacy, medicine("m2")])
+
+    assert backfill_reminder_fields_sync(db) == 1
+    assert backfill_reminder_fields_sync(db) == 0
+    filled = db.medicines.find_one({"_id": "m1"})
+    assert filled["next_fire_at"] is not None and "bucket" in filled
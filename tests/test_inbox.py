@@ -0,0 +1,51 @@
+from datetime import datetime
+
+from utils.inbox import Inbox
+
+
+def note(user_id="u1", **fields):
+    return {"user_id": user_id, "medicine_name": "Aspirin", "read": False, "created_at": datetime.utcnow(), **fields}
+
+
+class AddDuringCheck:
+    """Collection proxy that lets another add() land right after acknowledge() looks for unread records."""
+
+    def __init__(self, notes, inbox, rec):
+        self.notes, self.inbox, self.rec = notes, inbox, rec
+
+    def __getattr__(self, name):
+        return getattr(self.notes, name)
+
+    def find_one(self, *args, **kwargs):
+        found = self.notes.find_one(*args, **kwargs)
+        if self.rec:
+            rec, self.rec = self.rec, None
+            self.inbox.add(rec)
+        return found
+
+
+def test_acknowledge_counts_down_and_clears_drift(db):
+    inbox = Inbox(db)
+    for _ in range(3):
+        inbox.add(note())
+    # A record the TTL index removed while unread leaves the counter one too high.
+    db.notifications.delete_one({})
+
+    assert inbox.acknowledge("u1") == 2
+    assert inbox.unread_count("u1") == 0
+
+
+def test_acknowledge_keeps_an_add_that_races_it(db):
+    inbox = Inbox(db)
+    inbox.add(note())
+    db.notification_counters.update_one({"_id": "u1"}, {"$inc": {"unread": 1}})  # drift, so a reset is due
+    inbox.notes = AddDuringCheck(db.notifications, inbox, note())
+
+    inbox.acknowledge("u1")
+    assert db.notifications.count_documents({"read": False}) == 1
+    # The new record is still counted; the drift waits for the next acknowledge.
+    assert inbox.unread_count("u1") >= 1
+
+    inbox.notes = db.notifications
+    assert inbox.acknowledge("u1") == 1
+    assert inbox.unread_count("u1") == 0
@@ -0,0 +1,53 @@
+import time
+
+from utils import leases
+
+
+def settle():
+    # Given-back leases expire at "now"; claiming them needs a strictly later clock.
+    time.sleep(0.01)
+
+
+def test_single_worker_takes_every_shard(db):
+    a = leases.ShardLeasesSync(db, "a")
+    assert a.refresh() == set(range(leases.SHARDS))
+    assert leases.bucket_filter(a.owned) is None
+
+
+def test_second_worker_gets_its_share(db):
+    a, b = leases.ShardLeasesSync(db, "a"), leases.ShardLeasesSync(db, "b")
+    a.refresh()
+    # Live leases are not stolen; b only joins the head count.
+    assert b.refresh() == set()
+
+    half = leases.SHARDS // 2
+    assert a.refresh() == set(range(half))
+    settle()
+    assert b.refresh() == set(range(half, leases.SHARDS))
+    assert a.refresh() == set(range(half))
+
+
+def test_release_hands_shards_back(db):
+    a, b = leases.ShardLeasesSync(db, "a"), leases.ShardLeasesSync(db, "b")
+    a.refresh(), b.refresh(), a.refresh()
+    settle()
+    b.refresh()
+
+    b.release()
+    settle()
+    assert a.refresh() == set(range(leases.SHARDS))
+    assert db.reminder_workers.count_documents({}) == 1
+
+
+def test_async_leases_rebalance(adb, run):
+    async def scenario():
+        a, b = leases.ShardLeases(adb, "a"), leases.ShardLeases(adb, "b")
+        await a.refresh()
+        await b.refresh()
+        await a.refresh()
+        settle()
+        return a.owned, await b.refresh()
+
+    a_owned, b_owned = run(scenario())
+    assert a_owned.isdisjoint(b_owned)
+    assert a_owned | b_owned == set(range(leases.SHARDS))
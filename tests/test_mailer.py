@@ -0,0 +1,91 @@
+import smtplib
+import socket
+
+import pytest
+
+aiosmtpd = pytest.importorskip("aiosmtpd.controller")
+
+from utils.mailer import SMTPPool
+
+
+class Recorder:
+    def __init__(self):
+        self.messages = []
+        self._sessions = []
+
+    @property
+    def sessions(self):
+        # The list keeps each session alive, so ids are not reused.
+        return {id(s) for s in self._sessions}
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith("reject"):
+            return "550 No such user"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope.rcpt_tos)
+        self._sessions.append(session)
+        return "250 OK"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server():
+    handler = Recorder()
+    controller = aiosmtpd.Controller(handler, hostname="127.0.0.1", port=free_port())
+    controller.start()
+    try:
+        yield controller, handler
+    finally:
+        controller.stop()
+
+
+def make_pool(controller, **options):
+    return SMTPPool(controller.hostname, controller.port, sender="app@example.com", starttls=False, **options)
+
+
+def test_sends_reuse_pooled_sessions(smtp_server):
+    controller, handler = smtp_server
+    pool = make_pool(controller, size=3)
+    futures = [pool.submit(f"user{i}@example.com", "Reminder", "<p>hi</p>") for i in range(20)]
+    for f in futures:
+        f.result(timeout=10)
+    pool.close()
+
+    assert len(handler.messages) == 20
+    assert 1 <= len(handler.sessions) <= 3
+
+
+def test_idle_session_is_probed_and_redialled(smtp_server):
+    controller, handler = smtp_server
+    pool = make_pool(controller, size=1, max_idle=0)
+    pool.send("a@example.com", "Reminder", "<p>hi</p>")
+
+    # The server has dropped the idle session; the NOOP probe notices and the pool redials.
+    (conn, _), = pool._idle
+    conn.sock.shutdown(socket.SHUT_RDWR)
+    pool.send("b@example.com", "Reminder", "<p>hi</p>")
+    pool.close()
+
+    assert handler.messages == [["a@example.com"], ["b@example.com"]]
+    assert len(handler.sessions) == 2
+
+
+def test_rejected_recipient_keeps_the_session(smtp_server):
+    controller, handler = smtp_server
+    pool = make_pool(controller, size=1)
+    with pytest.raises(smtplib.SMTPRecipientsRefused):
+        pool.send("reject@example.com", "Reminder", "<p>hi</p>")
+    pool.send("ok@example.com", "Reminder", "<p>hi</p>")
+
+    assert handler.messages == [["ok@example.com"]]
+    assert len(handler.sessions) == 1
+    assert len(pool._idle) == 1
+    pool.close()
@@ -0,0 +1,15 @@
+from fastapi.testclient import TestClient
+
+import main
+
+
+def test_ready_hides_the_driver_error(monkeypatch, capsys):
+    async def unreachable(timeout=None):
+        raise RuntimeError("mongo-0.internal:27017: connection refused")
+
+    monkeypatch.setattr(main.db, "ping", unreachable)
+    response = TestClient(main.app).get("/ready")
+
+    assert response.status_code == 503
+    assert response.json() == {"status": "unavailable"}
+    assert "mongo-0.internal" in capsys.readouterr().out
@@ -0,0 +1,104 @@
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+
+from utils import outbox
+
+
+def entry(key="m1:2026-10-18T08:00", **fields):
+    doc = {
+        "_id": key, "medicine_id": "m1", "user_id": "u1", "bucket": 1,
+        "scheduled_at": datetime(2026, 10, 18, 8, 0), "to": "a@example.com",
+        "subject": "Reminder", "html": "<p>hi</p>", "status": "pending", "attempts": 0,
+        "next_attempt_at": datetime.utcnow() - timedelta(seconds=1), "created_at": datetime.utcnow(),
+    }
+    doc.update(fields)
+    return doc
+
+
+def done(error=None):
+    future = Future()
+    if error:
+        future.set_exception(error)
+    else:
+        future.set_result(None)
+    return future
+
+
+def test_enqueue_is_idempotent(db):
+    outbox.enqueue_sync(db.reminder_outbox, [entry()])
+    db.reminder_outbox.update_one({"_id": entry()["_id"]}, {"$set": {"status": "sent"}})
+    outbox.enqueue_sync(db.reminder_outbox, [entry()])
+
+    assert db.reminder_outbox.count_documents({}) == 1
+    assert db.reminder_outbox.find_one()["status"] == "sent"
+
+
+def test_sent_entry_is_marked_and_reported(db):
+    outbox.enqueue_sync(db.reminder_outbox, [entry()])
+    sent = []
+    assert outbox.drain_sync(db.reminder_outbox, lambda *a: done(), on_sent=sent.append) == 1
+
+    doc = db.reminder_outbox.find_one()
+    assert doc["status"] == "sent" and doc["attempts"] == 1 and "locked_until" not in doc
+    assert [e["_id"] for e in sent] == [doc["_id"]]
+    assert outbox.drain_sync(db.reminder_outbox, lambda *a: done()) == 0
+
+
+def test_failure_goes_back_to_pending_with_backoff(db):
+    outbox.enqueue_sync(db.reminder_outbox, [entry()])
+    before = datetime.utcnow()
+    outbox.drain_sync(db.reminder_outbox, lambda *a: done(OSError("connection reset")))
+
+    doc = db.reminder_outbox.find_one()
+    assert doc["status"] == "pending"
+    assert doc["attempts"] == 1
+    assert doc["last_error"] == "connection reset"
+    assert doc["next_attempt_at"] >= before + timedelta(seconds=outbox.BACKOFF_BASE * 0.8)
+    # Not due again until the backoff has passed.
+    assert outbox.drain_sync(db.reminder_outbox, lambda *a: done()) == 0
+
+
+def test_max_attempts_moves_entry_to_dead(db):
+    outbox.enqueue_sync(db.reminder_outbox, [entry(attempts=outbox.MAX_ATTEMPTS - 1)])
+    dead = []
+    outbox.drain_sync(db.reminder_outbox, lambda *a: done(OSError("refused")), on_dead=dead.append)
+
+    doc = db.reminder_outbox.find_one()
+    assert doc["status"] == "dead" and doc["attempts"] == outbox.MAX_ATTEMPTS
+    assert len(dead) == 1
+
+
+def test_expired_lock_is_reclaimed(db):
+    stuck = entry(status="sending", attempts=1, locked_until=datetime.utcnow() - timedelta(seconds=1))
+    held = entry(key="m2:2026-10-18T08:00", status="sending", attempts=1,
+                 locked_until=datetime.utcnow() + timedelta(minutes=5))
+    outbox.enqueue_sync(db.reminder_outbox, [stuck, held])
+
+    assert outbox.drain_sync(db.reminder_outbox, lambda *a: done()) == 1
+    assert db.reminder_outbox.find_one({"_id": stuck["_id"]})["status"] == "sent"
+    assert db.reminder_outbox.find_one({"_id": held["_id"]})["status"] == "sending"
+
+
+def test_match_limits_drain_to_owned_buckets(db):
+    outbox.enqueue_sync(db.reminder_outbox, [entry(), entry(key="m2:2026-10-18T08:00", bucket=2)])
+    assert outbox.drain_sync(db.reminder_outbox, lambda *a: done(), match={"bucket": {"$in": [2]}}) == 1
+    assert db.reminder_outbox.find_one({"bucket": 1})["status"] == "pending"
+
+
+def test_async_drain_retries_then_dead(adb, run):
+    async def failing(to, subject, html):
+        raise OSError("refused")
+
+    async def scenario():
+        await outbox.enqueue(adb.reminder_outbox, [entry(), entry(key="m2:2026-10-18T08:00", attempts=outbox.MAX_ATTEMPTS - 1)])
+        dead = []
+
+        async def on_dead(e):
+            dead.append(e["_id"])
+
+        assert await outbox.drain(adb.reminder_outbox, failing, on_dead=on_dead) == 2
+        return {d["_id"]: d["status"] async for d in adb.reminder_outbox.find()}, dead
+
+    statuses, dead = run(scenario())
+    assert statuses == {"m1:2026-10-18T08:00": "pending", "m2:2026-10-18T08:00": "dead"}
+    assert dead == ["m2:2026-10-18T08:00"]
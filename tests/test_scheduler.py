@@ -0,0 +1,30 @@
+from datetime import datetime, timedelta
+
+import scheduler
+from utils.user_cache import user_cache
+
+NOW = datetime(2026, 10, 18, 12, 0)
+
+
+def medicine(_id, user_id):
+    return {"_id": _id, "user_id": user_id, "bucket": 1, "name": "Aspirin", "dosage": "1",
+            "times": ["11:59"], "timezone": "UTC", "start_date": "2026-10-01",
+            "end_date": "2026-10-31", "next_fire_at": NOW - timedelta(minutes=1)}
+
+
+def test_tick_queues_mail_once_and_skips_popup_users(adb, run):
+    user_cache.clear()
+
+    async def scenario():
+        await adb.users.insert_many([
+            {"_id": "u1", "name": "A", "email": "a@example.com", "notification_pref": "both"},
+            {"_id": "u2", "name": "B", "email": "b@example.com", "notification_pref": "popup"},
+        ])
+        await adb.medicines.insert_many([medicine("m1", "u1"), medicine("m2", "u2")])
+        due = await scheduler.check_reminders(adb, now=NOW)
+        again = await scheduler.check_reminders(adb, now=NOW)
+        return due, again, await adb.reminder_outbox.find().to_list(None)
+
+    due, again, queued = run(scenario())
+    assert (due, again) == (2, 0)
+    assert [e["to"] for e in queued] == ["a@example.com"]
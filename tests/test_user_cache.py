@@ -0,0 +1,23 @@
+from utils.user_cache import prefs_update, resolve_users_sync, user_cache
+
+
+def test_prefs_change_in_another_process_reaches_the_cache(db):
+    user_cache.clear()
+    db.users.insert_one({"_id": "u1", "email": "a@example.com", "notification_pref": "email", "password": "x"})
+    assert resolve_users_sync(db.users, ["u1"])["u1"]["notification_pref"] == "email"
+
+    # Written elsewhere: this process's cache is never told directly.
+    db.users.update_one({"_id": "u1"}, prefs_update({"$set": {"notification_pref": "popup"}}))
+    user = resolve_users_sync(db.users, ["u1"])["u1"]
+    assert user["notification_pref"] == "popup"
+    assert "password" not in user
+
+
+def test_unversioned_writes_are_served_from_cache(db):
+    user_cache.clear()
+    db.users.insert_many([{"_id": "u1", "name": "A"}, {"_id": "u2", "name": "B"}])
+    resolve_users_sync(db.users, ["u1"])
+
+    db.users.update_one({"_id": "u1"}, {"$set": {"name": "changed"}})
+    users = resolve_users_sync(db.users, ["u1", "u2", None])
+    assert {uid: u["name"] for uid, u in users.items()} == {"u1": "A", "u2": "B"}
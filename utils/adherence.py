@@ -0,0 +1,170 @@
+from datetime import datetime, timedelta, timezone
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+from utils.outbox import outbox_key
+from utils.schedule import zone
+from utils.settings import get_settings
+
+STATUSES = ("taken", "skipped", "snoozed")
+EVENT_RETENTION = get_settings().adherence_retention_days * 24 * 3600
+
+# dose_events: append-only log, a time-series collection where the server supports one.
+# dose_outcomes: one row per dose that came due or was answered; holds the latest status,
+#   so a changed answer moves one count, not two, and "due" is counted once per dose.
+# adherence_daily: counters per (user, medicine, local day); medicine_id None is the user's total.
+
+
+def collection_options():
+    return {
+        "dose_events": {
+            "timeseries": {"timeField": "at", "metaField": "meta", "granularity": "minutes"},
+            "expireAfterSeconds": EVENT_RETENTION,
+        },
+    }
+
+
+def index_specs():
+    return {
+        "dose_outcomes": [([("updated_at", 1)], {"expireAfterSeconds": EVENT_RETENTION})],
+        "adherence_daily": [([("user_id", 1), ("medicine_id", 1), ("day", 1)], {})],
+    }
+
+
+def local_day(med, scheduled_at):
+    return scheduled_at.replace(tzinfo=timezone.utc).astimezone(zone(med.get("timezone"))).strftime("%Y-%m-%d")
+
+
+def _rollup_row(user_id, medicine_id, day, inc):
+    return UpdateOne(
+        {"_id": f"{user_id}:{medicine_id or '*'}:{day}"},
+        {"$inc": inc, "$setOnInsert": {"user_id": user_id, "medicine_id": medicine_id, "day": day}},
+        upsert=True
+    )
+
+
+def _rollup(med, day, inc):
+    # The medicine's row and the user's total move together.
+    return [_rollup_row(med["user_id"], med["_id"], day, inc), _rollup_row(med["user_id"], None, day, inc)]
+
+
+def due_updates(meds):
+    """Rollup writes counting each medicine's current `next_fire_at` as a dose that came due."""
+    updates, totals = [], {}
+    for med in meds:
+        day = local_day(med, med["next_fire_at"])
+        updates.append(_rollup_row(med["user_id"], med["_id"], day, {"due": 1}))
+        totals[(med["user_id"], day)] = totals.get((med["user_id"], day), 0) + 1
+    updates += [_rollup_row(user_id, None, day, {"due": n}) for (user_id, day), n in totals.items()]
+    return updates
+
+
+def _due_marks(doses, now):
+    # Inserts only: whoever creates a dose's outcome row (a tick, or an early answer) counts it as due.
+    return [
+        UpdateOne(
+            {"_id": outbox_key(d["_id"], d["next_fire_at"])},
+            {"$setOnInsert": {"user_id": d["user_id"], "medicine_id": d["_id"],
+                              "scheduled_at": d["next_fire_at"], "updated_at": now}},
+            upsert=True
+        ) for d in doses
+    ]
+
+
+def _inserted(doses, upserted):
+    return [doses[i] for i in sorted(upserted)]
+
+
+async def count_due(db, doses):
+    """Count `doses` (medicines carrying the instant in `next_fire_at`) as due, once per dose,
+    however many ticks see the same one."""
+    doses = [d for d in doses if d.get("user_id")]
+    if not doses:
+        return
+    try:
+        upserted = (await db.dose_outcomes.bulk_write(_due_marks(doses, datetime.utcnow()), ordered=False)).upserted_ids
+    except BulkWriteError as e:
+        # Duplicate keys are doses an overlapping tick marked first; it counts those.
+        upserted = {u["index"]: u["_id"] for u in e.details.get("upserted", [])}
+    updates = due_updates(_inserted(doses, upserted))
+    if updates:
+        await db.adherence_daily.bulk_write(updates, ordered=False)
+
+
+def count_due_sync(db, doses):
+    doses = [d for d in doses if d.get("user_id")]
+    if not doses:
+        return
+    try:
+        upserted = db.dose_outcomes.bulk_write(_due_marks(doses, datetime.utcnow()), ordered=False).upserted_ids
+    except BulkWriteError as e:
+        upserted = {u["index"]: u["_id"] for u in e.details.get("upserted", [])}
+    updates = due_updates(_inserted(doses, upserted))
+    if updates:
+        db.adherence_daily.bulk_write(updates, ordered=False)
+
+
+def _event(med, scheduled_at, status, now, extra):
+    return {
+        "at": now,
+        "meta": {"user_id": med["user_id"], "medicine_id": med["_id"]},
+        "scheduled_at": scheduled_at,
+        "status": status,
+        **extra,
+    }
+
+
+def _outcome(med, scheduled_at, status, now):
+    return (
+        {"_id": outbox_key(med["_id"], scheduled_at)},
+        {"$set": {"status": status, "updated_at": now},
+         "$setOnInsert": {"user_id": med["user_id"], "medicine_id": med["_id"], "scheduled_at": scheduled_at}},
+    )
+
+
+def _changes(med, scheduled_at, status, previous):
+    old = (previous or {}).get("status")
+    if old == status:
+        return []
+    inc = {status: 1}
+    if old:
+        inc[old] = -1
+    if previous is None:
+        # Answered before any tick reached it; the tick will find the row and not count it again.
+        inc["due"] = 1
+    return _rollup(med, local_day(med, scheduled_at), inc)
+
+
+async def record(db, med, scheduled_at, status, **extra):
+    """Append the event, then move the dose's rollup count from its old status to `status`."""
+    now = datetime.utcnow()
+    await db.dose_events.insert_one(_event(med, scheduled_at, status, now, extra))
+    query, update = _outcome(med, scheduled_at, status, now)
+    previous = await db.dose_outcomes.find_one_and_update(query, update, upsert=True, return_document=ReturnDocument.BEFORE)
+    updates = _changes(med, scheduled_at, status, previous)
+    if updates:
+        await db.adherence_daily.bulk_write(updates, ordered=False)
+
+
+def record_sync(db, med, scheduled_at, status, **extra):
+    now = datetime.utcnow()
+    db.dose_events.insert_one(_event(med, scheduled_at, status, now, extra))
+    query, update = _outcome(med, scheduled_at, status, now)
+    previous = db.dose_outcomes.find_one_and_update(query, update, upsert=True, return_document=ReturnDocument.BEFORE)
+    updates = _changes(med, scheduled_at, status, previous)
+    if updates:
+        db.adherence_daily.bulk_write(updates, ordered=False)
+
+
+def rollup_query(user_id, days, medicine_id=None, today=None):
+    since = ((today or datetime.utcnow()) - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+    return {"user_id": user_id, "medicine_id": medicine_id, "day": {"$gte": since}}
+
+
+def summarize(row):
+    """Public form of a rollup row; doses that came due with no answer count as missed."""
+    counts = {k: max(row.get(k, 0), 0) for k in ("due",) + STATUSES}
+    answered = counts["taken"] + counts["skipped"] + counts["snoozed"]
+    counts["missed"] = max(counts["due"] - answered, 0)
+    counts["day"] = row["day"]
+    counts["adherence"] = round(counts["taken"] / max(counts["due"], answered, 1), 3)
+    return counts
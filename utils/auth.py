@@ -1,15 +1,32 @@
 from passlib.context import CryptContext
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPBearer
+from bson import ObjectId
+from bson.errors import InvalidId
+import asyncio
+import hashlib
+import threading
+import time
 import jwt
-import os
-from dotenv import load_dotenv
+from utils.settings import get_settings
+from utils.timing import span
 
-load_dotenv()
-
-SECRET_KEY = os.getenv("SECRET_KEY", "secret")
+SECRET_KEY = get_settings().secret_key
 ALGORITHM = "HS256"
+BCRYPT_ROUNDS = get_settings().bcrypt_rounds
+PASSWORD_WORKERS = get_settings().password_workers
+TOKEN_CACHE_SIZE = get_settings().token_cache_size
+ADMIN_EMAILS = get_settings().admin_emails
+
+# Hashes made with fewer rounds than BCRYPT_ROUNDS count as outdated and get rehashed on login.
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt releases the GIL, so a small thread pool keeps it off the event loop
+# and caps how many cores logins can take at once.
+password_pool = ThreadPoolExecutor(max_workers=PASSWORD_WORKERS, thread_name_prefix="bcrypt")
 
 def hash_password(password: str):
     return pwd_context.hash(password)
@@ -17,7 +34,78 @@ def hash_password(password: str):
 def verify_password(password: str, hashed: str):
     return pwd_context.verify(password, hashed)
 
+async def hash_password_async(password: str):
+    loop = asyncio.get_running_loop()
+    with span("bcrypt"):
+        return await loop.run_in_executor(password_pool, pwd_context.hash, password)
+
+async def verify_and_update_async(password: str, hashed: str):
+    """Returns (ok, new_hash); new_hash is set when the stored hash should be replaced."""
+    loop = asyncio.get_running_loop()
+    with span("bcrypt"):
+        return await loop.run_in_executor(password_pool, pwd_context.verify_and_update, password, hashed)
+
 def create_token(data: dict):
     to_encode = data.copy()
     to_encode["exp"] = datetime.utcnow() + timedelta(hours=6)
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+
+class TokenCache:
+    """LRU of already-verified tokens, keyed by digest, so repeat requests skip the HMAC check."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry["exp"] <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry
+
+    def put(self, key, claims):
+        with self._lock:
+            self._data[key] = claims
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+token_cache = TokenCache(TOKEN_CACHE_SIZE)
+bearer = HTTPBearer(auto_error=False)
+
+def _unauthorized(detail="Not authenticated"):
+    return HTTPException(401, detail, headers={"WWW-Authenticate": "Bearer"})
+
+def decode_token(token: str):
+    key = hashlib.sha256(token.encode()).digest()
+    claims = token_cache.get(key)
+    if claims is None:
+        try:
+            claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM], options={"require": ["exp"]})
+        except jwt.PyJWTError:
+            raise _unauthorized("Invalid or expired token")
+        token_cache.put(key, claims)
+    return claims
+
+async def get_current_user(credentials=Depends(bearer)):
+    if credentials is None:
+        raise _unauthorized()
+    claims = decode_token(credentials.credentials)
+    try:
+        return {"id": ObjectId(claims["id"]), "email": claims.get("email")}
+    except (KeyError, InvalidId, TypeError):
+        raise _unauthorized("Invalid token")
+
+async def require_admin(user=Depends(get_current_user)):
+    # Admins are listed by email in ADMIN_EMAILS; with none configured nobody is.
+    if (user.get("email") or "").lower() not in ADMIN_EMAILS:
+        raise HTTPException(403, "Admin only")
+    return user
@@ -0,0 +1,63 @@
+from datetime import datetime
+from pymongo import UpdateOne
+from utils.leases import bucket_for
+from utils.schedule import next_fire_at, floor_minute
+import asyncio
+
+# Medicines written before the reminder fields existed; the tick never sees them until filled in.
+LEGACY_QUERY = {"$or": [{"next_fire_at": {"$exists": False}}, {"bucket": {"$exists": False}}]}
+LEGACY_FIELDS = {"user_id": 1, "times": 1, "start_date": 1, "end_date": 1, "timezone": 1, "next_fire_at": 1}
+BATCH = 1000
+
+
+def _fill(med, now):
+    # Guarded on the legacy query so overlapping runs and fresh writes are left alone.
+    return UpdateOne({"_id": med["_id"], **LEGACY_QUERY}, {"$set": {
+        "next_fire_at": med.get("next_fire_at", next_fire_at(med, now)),
+        "bucket": bucket_for(med.get("user_id")),
+    }})
+
+
+async def backfill_reminder_fields(db):
+    """Fill next_fire_at and bucket on legacy medicines, BATCH writes per round trip."""
+    now = floor_minute(datetime.utcnow())
+    filled, batch = 0, []
+    async for med in db.medicines.find(LEGACY_QUERY, LEGACY_FIELDS):
+        batch.append(_fill(med, now))
+        if len(batch) >= BATCH:
+            filled += (await db.medicines.bulk_write(batch, ordered=False)).modified_count
+            batch = []
+    if batch:
+        filled += (await db.medicines.bulk_write(batch, ordered=False)).modified_count
+    if filled:
+        print(f"Backfilled reminder fields on {filled} medicine(s)")
+    return filled
+
+
+def backfill_reminder_fields_sync(db):
+    now = floor_minute(datetime.utcnow())
+    filled, batch = 0, []
+    for med in db.medicines.find(LEGACY_QUERY, LEGACY_FIELDS):
+        batch.append(_fill(med, now))
+        if len(batch) >= BATCH:
+            filled += db.medicines.bulk_write(batch, ordered=False).modified_count
+            batch = []
+    if batch:
+        filled += db.medicines.bulk_write(batch, ordered=False).modified_count
+    if filled:
+        print(f"Backfilled reminder fields on {filled} medicine(s)")
+    return filled
+
+
+if __name__ == "__main__":
+    # python -m utils.backfill: the one-off migration, next to `python -m utils.indexes`.
+    from database import db
+
+    async def main():
+        db.connect()
+        try:
+            await backfill_reminder_fields(db)
+        finally:
+            db.close()
+
+    asyncio.run(main())
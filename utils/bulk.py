@@ -0,0 +1,83 @@
+from fastapi import HTTPException
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+import csv
+import io
+import re
+
+MAX_BULK_ROWS = 5000
+# Generous for MAX_BULK_ROWS rows; checked before an upload is read into memory.
+MAX_CSV_BYTES = MAX_BULK_ROWS * 1024
+
+
+def check_size(rows):
+    if len(rows) > MAX_BULK_ROWS:
+        raise HTTPException(413, f"At most {MAX_BULK_ROWS} rows per request")
+
+
+async def read_csv(upload, list_fields=()):
+    """Rows of an uploaded CSV as dicts; `list_fields` are split on ';', '|' or whitespace."""
+    too_large = HTTPException(413, f"At most {MAX_CSV_BYTES} bytes per upload")
+    if upload.size is not None and upload.size > MAX_CSV_BYTES:
+        raise too_large
+    # Bounded read as well: the size is only known when the client sent it.
+    data = await upload.read(MAX_CSV_BYTES + 1)
+    if len(data) > MAX_CSV_BYTES:
+        raise too_large
+    try:
+        text = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(400, "CSV must be UTF-8")
+    rows = []
+    for row in csv.DictReader(io.StringIO(text)):
+        row = {k.strip(): (v.strip() if isinstance(v, str) else v) for k, v in row.items() if k}
+        for field in list_fields:
+            if field in row:
+                row[field] = [v for v in re.split(r"[;|\s]+", row[field] or "") if v]
+        rows.append(row)
+    check_size(rows)
+    return rows
+
+
+def describe(exc):
+    if isinstance(exc, ValidationError):
+        return "; ".join(f"{'.'.join(str(p) for p in e['loc'])}: {e['msg']}" for e in exc.errors())
+    return str(exc)
+
+
+def validate_rows(rows, model):
+    valid, errors = [], []
+    for i, row in enumerate(rows):
+        if not isinstance(row, dict):
+            errors.append({"row": i, "error": "Expected an object"})
+            continue
+        try:
+            valid.append((i, model(**row)))
+        except ValidationError as e:
+            errors.append({"row": i, "error": describe(e)})
+    return valid, errors
+
+
+async def insert_rows(collection, indexed_docs):
+    """Unordered insert_many; returns ([(row, _id)], [row errors]) so one bad row never sinks the batch."""
+    if not indexed_docs:
+        return [], []
+    rows = [i for i, _ in indexed_docs]
+    docs = [doc for _, doc in indexed_docs]
+    failed = {}
+    try:
+        await collection.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        for err in e.details.get("writeErrors", []):
+            failed[err["index"]] = err.get("errmsg", "write failed")
+    inserted = [(rows[n], doc["_id"]) for n, doc in enumerate(docs) if n not in failed]
+    errors = [{"row": rows[n], "error": msg} for n, msg in failed.items()]
+    return inserted, errors
+
+
+def report(inserted, errors):
+    return {
+        "inserted": len(inserted),
+        "ids": [{"row": row, "id": str(_id)} for row, _id in inserted],
+        "errors": sorted(errors, key=lambda e: e["row"]),
+    }
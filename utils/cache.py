@@ -0,0 +1,109 @@
+from collections import OrderedDict
+from fastapi import Response
+from pydantic_core import to_json
+import hashlib
+import threading
+import time
+from utils.timing import span
+from utils.settings import get_settings
+
+RESPONSE_CACHE_TTL = get_settings().response_cache_ttl
+RESPONSE_CACHE_SIZE = get_settings().response_cache_size
+RESPONSE_CACHE_URL = get_settings().response_cache_url
+
+
+class LocalCache:
+    """In-process TTL/LRU store. Fine for one worker and for tests; not shared between processes."""
+
+    def __init__(self, maxsize=RESPONSE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] is not None and entry[0] <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry[1]
+
+    async def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl if ttl else None, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    async def incr(self, key):
+        with self._lock:
+            _, value = self._data.get(key, (None, 0))
+            self._data[key] = (None, value + 1)
+            self._data.move_to_end(key)
+            return value + 1
+
+
+class RedisCache:
+    """Shared store for multi-worker deployments; needs the optional `redis` package."""
+
+    def __init__(self, url):
+        import redis.asyncio as redis
+        self.client = redis.from_url(url)
+
+    async def get(self, key):
+        return await self.client.get(key)
+
+    async def set(self, key, value, ttl=None):
+        await self.client.set(key, value, ex=ttl)
+
+    async def incr(self, key):
+        return await self.client.incr(key)
+
+
+class ResponseCache:
+    """Read-through cache of serialized JSON responses, per user, invalidated by bumping a version."""
+
+    def __init__(self, backend, ttl=RESPONSE_CACHE_TTL):
+        self.backend = backend
+        self.ttl = ttl
+
+    async def _key(self, user_id, request):
+        version = int(await self.backend.get(f"ver:{user_id}") or 0)
+        query = "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+        return f"resp:{user_id}:{version}:{request.url.path}?{query}"
+
+    async def invalidate_user(self, user_id):
+        await self.backend.incr(f"ver:{user_id}")
+
+    async def respond(self, request, user_id, produce, model=None):
+        """JSON of `await produce()`, from the cache when it can be.
+
+        The route returns a raw Response, so FastAPI skips its `response_model`; pass the same
+        class as `model` to have the data validated and filtered by it once, when the cache fills.
+        """
+        key = await self._key(user_id, request)
+        cached = await self.backend.get(key)
+        if cached is None:
+            data = await produce()
+            with span("serialize"):
+                if model is not None:
+                    body = model.model_validate(data).model_dump_json().encode()
+                else:
+                    body = to_json(data, fallback=str)
+            etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            await self.backend.set(key, etag.encode() + b"\n" + body, self.ttl)
+        else:
+            etag, body = cached.split(b"\n", 1)
+            etag = etag.decode()
+
+        # The client revalidates every time; a matching ETag costs no DB work at all.
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type="application/json", headers=headers)
+
+
+response_cache = ResponseCache(RedisCache(RESPONSE_CACHE_URL) if RESPONSE_CACHE_URL else LocalCache())
@@ -0,0 +1,32 @@
+from collections import defaultdict
+from utils.outbox import new_entry, new_digest_entry
+from utils.schedule import local_hhmm
+from utils.templates import render_reminder, render_digest
+
+
+def reminder_entries(due):
+    """Outbox entries for `due` [(med, user)]: one per dose, or one per minute for users with `digest` on."""
+    groups = defaultdict(list)
+    for med, user in due:
+        key = ("digest", user["_id"], med["next_fire_at"]) if user.get("digest") else ("dose", med["_id"], med["next_fire_at"])
+        groups[key].append((med, user))
+
+    entries = []
+    for pairs in groups.values():
+        med, user = pairs[0]
+        at = med["next_fire_at"]
+        time_local = local_hhmm(at, med.get("timezone"))
+        extra = {"pref": user.get("notification_pref", "email"), "time_local": time_local}
+        if len(pairs) == 1:
+            subject, html = render_reminder(user, med, time_local)
+            entries.append(new_entry(med, user, at, subject, html, medicine_name=med.get("name"), **extra))
+        else:
+            meds = [m for m, _ in pairs]
+            subject, html = render_digest(user, meds, time_local)
+            entries.append(new_digest_entry(meds, user, at, subject, html, **extra))
+    return entries
+
+
+def log_savings(doses, entries):
+    if len(entries) < doses:
+        print(f"Digest: {doses} dose(s) queued as {len(entries)} email(s)")
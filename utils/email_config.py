@@ -1,18 +1,18 @@
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig
-from dotenv import load_dotenv
-import os
+from utils.mailer import get_pool
+from utils.settings import get_settings
 
-load_dotenv()
+settings = get_settings()
+MAIL_SERVER = settings.mail_server
+MAIL_PORT = settings.mail_port
+MAIL_POOL_SIZE = settings.mail_pool_size
 
-conf = ConnectionConfig(
-    MAIL_USERNAME=os.getenv("MAIL_USERNAME"),
-    MAIL_PASSWORD=os.getenv("MAIL_PASSWORD"),
-    MAIL_FROM=os.getenv("MAIL_FROM"),
-    MAIL_PORT=587,
-    MAIL_SERVER="smtp.gmail.com",
-    MAIL_STARTTLS=True,
-    MAIL_SSL_TLS=False,
-    USE_CREDENTIALS=True
+# Pooled sender for all outgoing mail.
+mailer = get_pool(
+    MAIL_SERVER,
+    MAIL_PORT,
+    settings.mail_username,
+    settings.mail_password,
+    settings.mail_from,
+    starttls=settings.mail_starttls,
+    size=MAIL_POOL_SIZE,
 )
-
-fm = FastMail(conf)
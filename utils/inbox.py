@@ -0,0 +1,74 @@
+from datetime import datetime
+from pymongo import ReturnDocument
+from utils.settings import get_settings
+
+NOTIFICATION_RETENTION = get_settings().notification_retention_days * 24 * 3600
+TOAST_LIMIT = get_settings().notification_toast_limit
+
+
+def index_specs():
+    return [
+        ([("user_id", 1), ("read", 1), ("created_at", -1)], {}),
+        ([("medicine_id", 1), ("scheduled_at", 1)], {}),
+        ([("created_at", 1)], {"expireAfterSeconds": NOTIFICATION_RETENTION}),
+    ]
+
+
+class Inbox:
+    """In-app notifications in `db.notifications`, with a per-user unread counter in `db.notification_counters`."""
+
+    def __init__(self, db):
+        self.notes = db.notifications
+        self.counters = db.notification_counters
+
+    def _bump(self, user_id, n):
+        self.counters.update_one({"_id": user_id}, {"$inc": {"unread": n}}, upsert=True)
+
+    def add(self, rec):
+        """Store `rec`; one record per dose when it carries medicine_id and scheduled_at. True if it was new."""
+        if rec.get("medicine_id") is not None and rec.get("scheduled_at") is not None:
+            result = self.notes.update_one(
+                {"medicine_id": rec["medicine_id"], "scheduled_at": rec["scheduled_at"]},
+                {"$setOnInsert": rec},
+                upsert=True
+            )
+            if result.upserted_id is None:
+                return False
+        else:
+            self.notes.insert_one(rec)
+        # Bumped after the insert, which acknowledge() relies on to never zero over a new record.
+        self._bump(rec["user_id"], 1)
+        return True
+
+    def unread(self, user_id, limit=TOAST_LIMIT):
+        return list(self.notes.find({"user_id": user_id, "read": False}).sort("created_at", -1).limit(limit))
+
+    def recount(self, user_id):
+        n = self.notes.count_documents({"user_id": user_id, "read": False})
+        self.counters.update_one({"_id": user_id}, {"$set": {"unread": n}}, upsert=True)
+        return n
+
+    def unread_count(self, user_id):
+        # Users from before the counter existed get one real count, then it is maintained.
+        doc = self.counters.find_one({"_id": user_id})
+        if doc is None:
+            return self.recount(user_id)
+        return max(doc.get("unread", 0), 0)
+
+    def acknowledge(self, user_id, ids=None, before=None):
+        """Mark `ids`, or everything created up to `before`, read in one update_many; returns how many changed."""
+        query = {"user_id": user_id, "read": False}
+        if ids is not None:
+            query["_id"] = {"$in": list(ids)}
+        if before is not None:
+            query["created_at"] = {"$lte": before}
+        result = self.notes.update_many(query, {"$set": {"read": True, "read_at": datetime.utcnow()}})
+        counter = self.counters.find_one_and_update(
+            {"_id": user_id}, {"$inc": {"unread": -result.modified_count}},
+            upsert=True, return_document=ReturnDocument.AFTER
+        )
+        if counter["unread"] and self.notes.find_one({"user_id": user_id, "read": False}, {"_id": 1}) is None:
+            # Nothing unread is left: clear drift from unread records the TTL index removed. Only
+            # from the value just read, so an add() landing in between keeps its increment.
+            self.counters.update_one({"_id": user_id, "unread": counter["unread"]}, {"$set": {"unread": 0}})
+        return result.modified_count
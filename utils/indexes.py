@@ -0,0 +1,144 @@
+from bson import ObjectId
+from datetime import datetime
+from pymongo.errors import CollectionInvalid, OperationFailure
+from utils import adherence, inbox, leases, outbox
+import asyncio
+from utils.settings import get_settings
+
+# collection -> [(keys, options)]; the single place indexes are declared.
+INDEXES = {
+    "users": [
+        ([("email", 1)], {"unique": True}),
+    ],
+    "medicines": [
+        ([("next_fire_at", 1)], {}),
+        ([("bucket", 1), ("next_fire_at", 1)], {}),
+        ([("user_id", 1), ("created_at", -1)], {}),
+        ([("user_id", 1), ("_id", 1)], {}),
+    ],
+    "prescriptions": [
+        ([("user_id", 1), ("created_at", -1)], {}),
+        ([("user_id", 1), ("_id", 1)], {}),
+    ],
+    "notifications": inbox.index_specs(),
+    "reminder_outbox": outbox.index_specs(),
+    "reminder_workers": leases.index_specs(),
+    **adherence.index_specs(),
+}
+
+# Collections that need options at creation time (e.g. time-series), made before any insert.
+COLLECTIONS = {
+    **adherence.collection_options(),
+}
+
+
+def hot_queries():
+    """(name, collection, filter, sort) for every query that must never scan a collection."""
+    uid = ObjectId()
+    now = datetime.utcnow()
+    return [
+        ("login", "users", {"email": "probe@example.com"}, None),
+        ("reminder tick", "medicines", {"next_fire_at": {"$lte": now}}, None),
+        ("sharded reminder tick", "medicines", {"bucket": {"$in": [0, 1]}, "next_fire_at": {"$lte": now}}, None),
+        ("user medicines", "medicines", {"user_id": uid}, [("created_at", -1)]),
+        ("user prescriptions", "prescriptions", {"user_id": uid}, [("created_at", -1)]),
+        ("user medicine page", "medicines", {"user_id": uid, "_id": {"$gt": uid}}, [("_id", 1)]),
+        ("user prescription page", "prescriptions", {"user_id": uid, "_id": {"$gt": uid}}, [("_id", 1)]),
+        ("unread notifications", "notifications", {"user_id": uid, "read": False}, [("created_at", -1)]),
+        ("adherence chart", "adherence_daily", {"user_id": uid, "medicine_id": None, "day": {"$gte": "2000-01-01"}}, [("day", 1)]),
+        ("outbox claim", "reminder_outbox", {"status": "pending", "next_attempt_at": {"$lte": now}}, None),
+    ]
+
+
+def _has_collscan(plan):
+    if isinstance(plan, dict):
+        if plan.get("stage") == "COLLSCAN":
+            return True
+        return any(_has_collscan(v) for v in plan.values())
+    if isinstance(plan, list):
+        return any(_has_collscan(v) for v in plan)
+    return False
+
+
+def _check(results):
+    scans = [
+        name for name, plan in results
+        if _has_collscan(plan.get("queryPlanner", {}).get("winningPlan", plan))
+    ]
+    if scans:
+        raise RuntimeError(f"Hot queries fall back to COLLSCAN: {', '.join(scans)}")
+
+
+def _create_failed(name, e):
+    # Servers without time-series support fall back to a plain collection.
+    print(f"Could not create {name} with its options ({e}); using a plain collection")
+
+
+async def ensure_indexes(db):
+    existing = set(await db.list_collection_names())
+    for name, options in COLLECTIONS.items():
+        if name not in existing:
+            try:
+                await db.create_collection(name, **options)
+            except CollectionInvalid:
+                pass
+            except OperationFailure as e:
+                _create_failed(name, e)
+    for name, specs in INDEXES.items():
+        for keys, options in specs:
+            await db[name].create_index(keys, **options)
+
+
+def ensure_indexes_sync(db):
+    existing = set(db.list_collection_names())
+    for name, options in COLLECTIONS.items():
+        if name not in existing:
+            try:
+                db.create_collection(name, **options)
+            except CollectionInvalid:
+                pass
+            except OperationFailure as e:
+                _create_failed(name, e)
+    for name, specs in INDEXES.items():
+        for keys, options in specs:
+            db[name].create_index(keys, **options)
+
+
+async def verify_query_plans(db):
+    results = []
+    for name, collection, query, sort in hot_queries():
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        results.append((name, await cursor.explain()))
+    _check(results)
+
+
+def verify_query_plans_sync(db):
+    results = []
+    for name, collection, query, sort in hot_queries():
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        results.append((name, cursor.explain()))
+    _check(results)
+
+
+def should_verify():
+    return get_settings().verify_query_plans
+
+
+if __name__ == "__main__":
+    # python -m utils.indexes: create everything, then fail if any hot query scans.
+    from database import db
+
+    async def main():
+        db.connect()
+        try:
+            await ensure_indexes(db)
+            await verify_query_plans(db)
+            print("All hot queries use an index.")
+        finally:
+            db.close()
+
+    asyncio.run(main())
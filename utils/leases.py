@@ -0,0 +1,140 @@
+from datetime import datetime, timedelta
+from pymongo.errors import DuplicateKeyError
+import math
+import os
+import socket
+import uuid
+import zlib
+from utils.settings import get_settings
+
+# Medicines carry a fixed bucket so the shard count can change without rewriting them.
+BUCKETS = 1024
+SHARDS = get_settings().reminder_shards
+LEASE_SECONDS = get_settings().reminder_lease_seconds
+RENEW_SECONDS = max(1, LEASE_SECONDS // 3)
+
+
+def bucket_for(user_id):
+    return zlib.crc32(str(user_id).encode()) % BUCKETS
+
+
+def shard_for(bucket):
+    return bucket % SHARDS
+
+
+def bucket_filter(shards):
+    """Mongo filter for the buckets in `shards`; None means 'no filter', i.e. all shards owned."""
+    if len(shards) >= SHARDS:
+        return None
+    return {"$in": [b for b in range(BUCKETS) if shard_for(b) in shards]}
+
+
+def new_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+def _fair_share(live_workers):
+    return math.ceil(SHARDS / max(live_workers, 1))
+
+
+def _claim_order(owned):
+    # Renew what we hold before reaching for anything new, so leases don't churn.
+    return sorted(owned) + [s for s in range(SHARDS) if s not in owned]
+
+
+def _expiry(now):
+    return now + timedelta(seconds=LEASE_SECONDS)
+
+
+def index_specs():
+    return [([("seen_at", 1)], {"expireAfterSeconds": LEASE_SECONDS * 10})]
+
+
+def _heartbeat(worker_id, now):
+    return {"_id": worker_id}, {"$set": {"seen_at": now}}
+
+
+def _live_query(now):
+    return {"seen_at": {"$gt": now - timedelta(seconds=LEASE_SECONDS)}}
+
+
+def _claim(shard, worker_id, now):
+    # Ours already, or expired; a live lease held by someone else makes the upsert hit a duplicate key.
+    query = {"_id": shard, "$or": [{"owner": worker_id}, {"expires_at": {"$lt": now}}]}
+    return query, {"$set": {"owner": worker_id, "expires_at": _expiry(now)}}
+
+
+def _give_back(shards, worker_id, now):
+    query = {"owner": worker_id}
+    if shards is not None:
+        query["_id"] = {"$in": list(shards)}
+    return query, {"$set": {"expires_at": now}}
+
+
+class _LeaseState:
+    def __init__(self, db, worker_id=None):
+        self.leases = db.reminder_leases
+        self.workers = db.reminder_workers
+        self.worker_id = worker_id or new_worker_id()
+        self.owned = set()
+
+
+class ShardLeases(_LeaseState):
+    """Claims, renews and rebalances shard leases held in `db.reminder_leases`."""
+
+    async def refresh(self):
+        now = datetime.utcnow()
+        await self.workers.update_one(*_heartbeat(self.worker_id, now), upsert=True)
+        target = _fair_share(await self.workers.count_documents(_live_query(now)))
+
+        owned = set()
+        for shard in _claim_order(self.owned):
+            if len(owned) >= target:
+                break
+            try:
+                await self.leases.find_one_and_update(*_claim(shard, self.worker_id, now), upsert=True)
+            except DuplicateKeyError:
+                continue  # someone else holds a live lease
+            owned.add(shard)
+
+        # Give back anything above our share so a newly started worker can take it.
+        extra = self.owned - owned
+        if extra:
+            await self.leases.update_many(*_give_back(extra, self.worker_id, now))
+        self.owned = owned
+        return owned
+
+    async def release(self):
+        await self.leases.update_many(*_give_back(None, self.worker_id, datetime.utcnow()))
+        await self.workers.delete_one({"_id": self.worker_id})
+        self.owned = set()
+
+
+class ShardLeasesSync(_LeaseState):
+    """Blocking twin of `ShardLeases` for pymongo callers."""
+
+    def refresh(self):
+        now = datetime.utcnow()
+        self.workers.update_one(*_heartbeat(self.worker_id, now), upsert=True)
+        target = _fair_share(self.workers.count_documents(_live_query(now)))
+
+        owned = set()
+        for shard in _claim_order(self.owned):
+            if len(owned) >= target:
+                break
+            try:
+                self.leases.find_one_and_update(*_claim(shard, self.worker_id, now), upsert=True)
+            except DuplicateKeyError:
+                continue
+            owned.add(shard)
+
+        extra = self.owned - owned
+        if extra:
+            self.leases.update_many(*_give_back(extra, self.worker_id, now))
+        self.owned = owned
+        return owned
+
+    def release(self):
+        self.leases.update_many(*_give_back(None, self.worker_id, datetime.utcnow()))
+        self.workers.delete_one({"_id": self.worker_id})
+        self.owned = set()
@@ -0,0 +1,147 @@
+from concurrent.futures import ThreadPoolExecutor
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+import asyncio
+import smtplib
+import threading
+import time
+from utils import metrics
+
+# Errors after which a pooled connection is thrown away and redialled.
+# (smtplib's own exceptions subclass OSError, so answered errors are caught first.)
+STALE_ERRORS = (smtplib.SMTPServerDisconnected, OSError)
+ANSWERED_ERRORS = (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused)
+
+
+def build_message(sender, to_email, subject, html_body):
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = subject
+    msg["From"] = sender
+    msg["To"] = to_email
+    msg.attach(MIMEText(html_body, "html"))
+    return msg
+
+
+class SMTPPool:
+    """Keeps up to `size` authenticated SMTP connections and sends on at most `size` threads."""
+
+    def __init__(self, host, port, username=None, password=None, sender=None,
+                 starttls=True, use_ssl=False, size=4, timeout=15, max_idle=60):
+        self.host = host
+        self.port = int(port)
+        self.username = username
+        self.password = password
+        self.sender = sender or username
+        self.starttls = starttls
+        self.use_ssl = use_ssl
+        self.size = size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="smtp")
+
+    def _connect(self):
+        if self.use_ssl:
+            conn = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            conn = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            conn.ehlo()
+            if self.starttls:
+                conn.starttls()
+                conn.ehlo()
+        if self.username and self.password:
+            conn.login(self.username, self.password)
+        return conn
+
+    def _acquire(self):
+        with self._lock:
+            entry = self._idle.pop() if self._idle else None
+        if entry is None:
+            return self._connect()
+        conn, last_used = entry
+        if time.monotonic() - last_used > self.max_idle:
+            # Servers drop idle sessions; probe before trusting it.
+            try:
+                if conn.noop()[0] != 250:
+                    raise smtplib.SMTPServerDisconnected("noop failed")
+            except STALE_ERRORS:
+                self._discard(conn)
+                return self._connect()
+        return conn
+
+    def _release(self, conn):
+        with self._lock:
+            self._idle.append((conn, time.monotonic()))
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def send(self, to_email, subject, html_body):
+        msg = build_message(self.sender, to_email, subject, html_body).as_string()
+        started = time.perf_counter()
+        try:
+            self._send(to_email, msg)
+        except Exception as e:
+            metrics.SMTP_FAILURES.labels(type(e).__name__).inc()
+            raise
+        finally:
+            metrics.SMTP_SEND_SECONDS.observe(time.perf_counter() - started)
+
+    def _send(self, to_email, msg):
+        with self._slots:
+            conn = self._acquire()
+            try:
+                conn.sendmail(self.sender, [to_email], msg)
+            except ANSWERED_ERRORS:
+                # The server rejected this message; the session itself is fine.
+                self._release(conn)
+                raise
+            except STALE_ERRORS:
+                # One retry on a fresh connection, then let it surface.
+                self._discard(conn)
+                conn = self._connect()
+                try:
+                    conn.sendmail(self.sender, [to_email], msg)
+                except Exception:
+                    self._discard(conn)
+                    raise
+            except Exception:
+                self._discard(conn)
+                raise
+            self._release(conn)
+
+    def submit(self, to_email, subject, html_body):
+        return self._executor.submit(self.send, to_email, subject, html_body)
+
+    async def send_async(self, to_email, subject, html_body):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self.send, to_email, subject, html_body)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            try:
+                conn.quit()
+            except Exception:
+                self._discard(conn)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(host, port, username=None, password=None, sender=None, **options):
+    """One pool per server/account per process, so callers that re-run (Streamlit) reuse it."""
+    key = (host, int(port), username, sender)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = SMTPPool(host, port, username, password, sender, **options)
+            _pools[key] = pool
+        return pool
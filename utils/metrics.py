@@ -0,0 +1,74 @@
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest, start_http_server
+from pymongo import monitoring
+from utils import timing
+from utils.settings import get_settings
+
+# Port for processes without an HTTP server of their own (the Streamlit app and its worker).
+METRICS_PORT = get_settings().metrics_port
+
+TICK_SECONDS = Histogram(
+    "reminder_tick_seconds", "Wall time of one reminder tick",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+TICK_OVERRUNS = Counter("reminder_tick_overruns_total", "Ticks that took longer than the tick interval")
+DUE_MEDICINES = Histogram(
+    "reminder_due_medicines", "Medicines found due in one tick",
+    buckets=(0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000),
+)
+SMTP_SEND_SECONDS = Histogram(
+    "smtp_send_seconds", "Time to hand one message to the SMTP server, pool wait included",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30),
+)
+SMTP_FAILURES = Counter("smtp_send_failures_total", "Messages the SMTP server did not accept", ["error"])
+MONGO_COMMAND_SECONDS = Histogram(
+    "mongo_command_seconds", "Round trip of one MongoDB command", ["command"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+MONGO_COMMAND_FAILURES = Counter("mongo_command_failures_total", "MongoDB commands that failed", ["command"])
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_seconds", "Latency of one API request, by route template", ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+RATE_LIMITED = Counter("rate_limited_total", "Requests refused with 429, by the limit they hit", ["limit"])
+
+
+class CommandTimer(monitoring.CommandListener):
+    """Feeds every driver command's duration into MONGO_COMMAND_SECONDS and the request's `db` span."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_COMMAND_SECONDS.labels(event.command_name).observe(event.duration_micros / 1e6)
+        timing.add("db", event.duration_micros / 1e6)
+
+    def failed(self, event):
+        MONGO_COMMAND_SECONDS.labels(event.command_name).observe(event.duration_micros / 1e6)
+        timing.add("db", event.duration_micros / 1e6)
+        MONGO_COMMAND_FAILURES.labels(event.command_name).inc()
+
+
+command_timer = CommandTimer()
+
+
+def observe_tick(duration, due, interval):
+    TICK_SECONDS.observe(duration)
+    DUE_MEDICINES.observe(due)
+    if duration > interval:
+        TICK_OVERRUNS.inc()
+
+
+def render():
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+_exporter_started = False
+
+
+def start_exporter(port=METRICS_PORT):
+    """Serve /metrics on `port` from a background thread, once per process; 0 disables it."""
+    global _exporter_started
+    if port and not _exporter_started:
+        start_http_server(port)
+        _exporter_started = True
+        print(f"Metrics exporter listening on :{port}")
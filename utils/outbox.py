@@ -0,0 +1,173 @@
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument, UpdateOne
+import asyncio
+import hashlib
+import random
+from utils.settings import get_settings
+
+MAX_ATTEMPTS = get_settings().outbox_max_attempts
+BACKOFF_BASE = get_settings().outbox_backoff_base  # seconds
+BACKOFF_MAX = get_settings().outbox_backoff_max
+LOCK_SECONDS = 300
+SENT_RETENTION = 7 * 24 * 3600
+
+
+def outbox_key(medicine_id, scheduled_at):
+    # One document per dose: a re-run tick upserts the same key and changes nothing.
+    return f"{medicine_id}:{scheduled_at.strftime('%Y-%m-%dT%H:%M')}"
+
+
+def new_entry(med, user, scheduled_at, subject, html, **extra):
+    now = datetime.utcnow()
+    entry = {
+        "_id": outbox_key(med["_id"], scheduled_at),
+        "medicine_id": med["_id"],
+        "user_id": med.get("user_id"),
+        "bucket": med.get("bucket"),
+        "scheduled_at": scheduled_at,
+        "to": user.get("email"),
+        "subject": subject,
+        "html": html,
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now,
+    }
+    entry.update(extra)
+    return entry
+
+
+def digest_key(user_id, scheduled_at, medicine_ids):
+    # The same set of doses always maps to the same key, so a re-run tick is still a no-op.
+    ids = hashlib.sha1(",".join(sorted(str(i) for i in medicine_ids)).encode()).hexdigest()[:12]
+    return f"digest:{user_id}:{scheduled_at.strftime('%Y-%m-%dT%H:%M')}:{ids}"
+
+
+def new_digest_entry(meds, user, scheduled_at, subject, html, **extra):
+    """One outbox entry covering several of one user's doses; `medicines` lists what it carries."""
+    entry = new_entry(meds[0], user, scheduled_at, subject, html, **extra)
+    entry["_id"] = digest_key(entry["user_id"], scheduled_at, [m["_id"] for m in meds])
+    entry["medicine_id"] = None
+    entry["medicines"] = [{"medicine_id": m["_id"], "medicine_name": m.get("name")} for m in meds]
+    return entry
+
+
+def backoff_delay(attempts):
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** max(attempts - 1, 0))
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def _claim(now, match=None):
+    # Pending work that is due, or work whose worker died holding the lock.
+    query = {"$or": [
+        {"status": "pending", "next_attempt_at": {"$lte": now}},
+        {"status": "sending", "locked_until": {"$lte": now}},
+    ]}
+    if match:
+        query.update(match)
+    update = {
+        "$set": {"status": "sending", "locked_until": now + timedelta(seconds=LOCK_SECONDS)},
+        "$inc": {"attempts": 1},
+    }
+    return query, update
+
+
+def _sent_update():
+    return {"$set": {"status": "sent", "sent_at": datetime.utcnow()}, "$unset": {"locked_until": ""}}
+
+
+def _failed_update(entry, error):
+    now = datetime.utcnow()
+    fields = {"last_error": str(error)[:500], "failed_at": now}
+    if entry["attempts"] >= MAX_ATTEMPTS:
+        fields["status"] = "dead"
+    else:
+        fields["status"] = "pending"
+        fields["next_attempt_at"] = now + backoff_delay(entry["attempts"])
+    return {"$set": fields, "$unset": {"locked_until": ""}}
+
+
+def index_specs():
+    return [
+        ([("status", 1), ("next_attempt_at", 1)], {}),
+        ([("bucket", 1), ("status", 1), ("next_attempt_at", 1)], {}),
+        ([("sent_at", 1)], {"expireAfterSeconds": SENT_RETENTION}),
+    ]
+
+
+def _upserts(entries):
+    return [UpdateOne({"_id": e["_id"]}, {"$setOnInsert": e}, upsert=True) for e in entries]
+
+
+async def enqueue(collection, entries):
+    if entries:
+        await collection.bulk_write(_upserts(entries), ordered=False)
+
+
+def enqueue_sync(collection, entries):
+    if entries:
+        collection.bulk_write(_upserts(entries), ordered=False)
+
+
+async def drain(collection, send, concurrency=4, on_sent=None, on_dead=None, match=None):
+    """Deliver due outbox entries with `await send(to, subject, html)` until none are left."""
+    slots = asyncio.Semaphore(concurrency)
+    tasks = []
+
+    async def deliver(entry):
+        try:
+            await send(entry["to"], entry["subject"], entry["html"])
+        except Exception as e:
+            update = _failed_update(entry, e)
+            await collection.update_one({"_id": entry["_id"]}, update)
+            print(f"Outbox delivery failed ({entry['_id']}, attempt {entry['attempts']}):", e)
+            if update["$set"]["status"] == "dead" and on_dead:
+                await on_dead(entry)
+        else:
+            await collection.update_one({"_id": entry["_id"]}, _sent_update())
+            if on_sent:
+                await on_sent(entry)
+        finally:
+            slots.release()
+
+    while True:
+        await slots.acquire()
+        query, update = _claim(datetime.utcnow(), match)
+        entry = await collection.find_one_and_update(query, update, return_document=ReturnDocument.AFTER)
+        if entry is None:
+            slots.release()
+            break
+        tasks.append(asyncio.create_task(deliver(entry)))
+
+    await asyncio.gather(*tasks)
+    return len(tasks)
+
+
+def drain_sync(collection, submit, batch=100, on_sent=None, on_dead=None, match=None):
+    """Blocking twin of `drain`; `submit(to, subject, html)` returns a future."""
+    total = 0
+    while True:
+        claimed = []
+        for _ in range(batch):
+            query, update = _claim(datetime.utcnow(), match)
+            entry = collection.find_one_and_update(query, update, return_document=ReturnDocument.AFTER)
+            if entry is None:
+                break
+            claimed.append((entry, submit(entry["to"], entry["subject"], entry["html"])))
+        if not claimed:
+            return total
+        total += len(claimed)
+
+        for entry, future in claimed:
+            try:
+                future.result()
+            except Exception as e:
+                update = _failed_update(entry, e)
+                collection.update_one({"_id": entry["_id"]}, update)
+                print(f"Outbox delivery failed ({entry['_id']}, attempt {entry['attempts']}):", e)
+                if update["$set"]["status"] == "dead" and on_dead:
+                    on_dead(entry)
+            else:
+                collection.update_one({"_id": entry["_id"]}, _sent_update())
+                if on_sent:
+                    on_sent(entry)
@@ -0,0 +1,56 @@
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+from pydantic_core import to_json
+import base64
+import binascii
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+def encode_cursor(last_id):
+    return base64.urlsafe_b64encode(str(last_id).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return ObjectId(base64.urlsafe_b64decode(padded).decode())
+    except (binascii.Error, UnicodeDecodeError, InvalidId, TypeError, ValueError):
+        raise HTTPException(400, "Invalid cursor")
+
+
+def projection(model):
+    """Mongo projection of exactly the fields `model` returns; its `id` comes from `_id`."""
+    return {name: 1 for name in model.model_fields if name != "id"}
+
+
+def to_public(doc):
+    doc["id"] = str(doc.pop("_id"))
+    return doc
+
+
+async def paginate(collection, query, projection, cursor=None, limit=DEFAULT_LIMIT):
+    """Keyset page ordered by _id; fetches one extra row to know whether there is a next page."""
+    if cursor:
+        query = {**query, "_id": {"$gt": decode_cursor(cursor)}}
+    docs = await collection.find(query, projection).sort("_id", 1).to_list(limit + 1)
+    next_cursor = encode_cursor(docs[limit - 1]["_id"]) if len(docs) > limit else None
+    return {"items": [to_public(d) for d in docs[:limit]], "next_cursor": next_cursor}
+
+
+async def paginate_pipeline(collection, query, stages, cursor=None, limit=DEFAULT_LIMIT):
+    """Same keyset page as `paginate`, with `stages` (e.g. a $lookup) run only on the page's rows."""
+    if cursor:
+        query = {**query, "_id": {"$gt": decode_cursor(cursor)}}
+    pipeline = [{"$match": query}, {"$sort": {"_id": 1}}, {"$limit": limit + 1}, *stages]
+    docs = await collection.aggregate(pipeline).to_list(None)
+    next_cursor = encode_cursor(docs[limit - 1]["_id"]) if len(docs) > limit else None
+    return {"items": [to_public(d) for d in docs[:limit]], "next_cursor": next_cursor}
+
+
+async def stream_ndjson(collection, query, model):
+    # One line per document straight off the cursor; nothing is buffered.
+    async for doc in collection.find(query, projection(model)).sort("_id", 1):
+        yield to_json(to_public(doc), fallback=str) + b"\n"
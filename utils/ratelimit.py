@@ -0,0 +1,132 @@
+from collections import OrderedDict
+from fastapi import HTTPException, Request
+import math
+import threading
+import time
+from utils import metrics
+from utils.settings import get_settings
+
+# Token buckets: RATE tokens per minute refill up to BURST; each attempt spends one.
+AUTH_IP_RATE = get_settings().auth_ip_rate
+AUTH_IP_BURST = get_settings().auth_ip_burst
+AUTH_EMAIL_RATE = get_settings().auth_email_rate
+AUTH_EMAIL_BURST = get_settings().auth_email_burst
+# Requests in flight per process before writes are refused rather than queued.
+WRITE_CONCURRENCY = get_settings().write_concurrency
+BULK_CONCURRENCY = get_settings().bulk_concurrency
+RATE_LIMIT_KEYS = get_settings().rate_limit_keys
+RATE_LIMIT_URL = get_settings().rate_limit_url
+# Only behind a proxy that sets X-Forwarded-For; otherwise clients could pick their own key.
+TRUST_FORWARDED = get_settings().rate_limit_trust_forwarded
+
+
+def too_many(limit, retry_after):
+    metrics.RATE_LIMITED.labels(limit).inc()
+    return HTTPException(429, "Too many requests, try again later",
+                         headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+
+class LocalLimiterStore:
+    """Buckets in this process only; with several workers each one enforces its own limit."""
+
+    def __init__(self, maxsize=RATE_LIMIT_KEYS):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def take(self, key, rate, burst, cost=1):
+        """Spend `cost` tokens from `key`'s bucket; 0 if allowed, else seconds until it would be."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            wait = 0.0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                wait = (cost - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            # An evicted key just starts again with a full bucket.
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+            return wait
+
+
+# Same arithmetic as LocalLimiterStore.take, atomic on the server and on the server's clock.
+TAKE_SCRIPT = """
+local rate, burst, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local b = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(b[1]) or burst
+local updated = tonumber(b[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= cost then tokens = tokens - cost else wait = (cost - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisLimiterStore:
+    """Buckets shared by every worker; needs the optional `redis` package."""
+
+    def __init__(self, url):
+        import redis.asyncio as redis
+        self.client = redis.from_url(url)
+        self._take = self.client.register_script(TAKE_SCRIPT)
+
+    async def take(self, key, rate, burst, cost=1):
+        return float(await self._take(keys=[f"rl:{key}"], args=[rate, burst, cost]))
+
+
+class RateLimiter:
+    def __init__(self, store):
+        self.store = store
+
+    async def hit(self, limit, key, per_minute, burst):
+        """Spend one token for `key` under `limit`, or raise 429 with Retry-After."""
+        wait = await self.store.take(f"{limit}:{key}", per_minute / 60.0, burst)
+        if wait > 0:
+            raise too_many(limit, wait)
+
+    def per_ip(self, limit, per_minute, burst):
+        """Route dependency limiting by client address."""
+        async def dependency(request: Request):
+            await self.hit(limit, client_ip(request), per_minute, burst)
+        return dependency
+
+
+def client_ip(request):
+    if TRUST_FORWARDED:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+class ConcurrencyLimit:
+    """Route dependency admitting at most `limit` requests at once in this process; the rest get 429."""
+
+    def __init__(self, name, limit, retry_after=1):
+        self.name = name
+        self.limit = limit
+        self.retry_after = retry_after
+        self.active = 0
+
+    async def __call__(self):
+        # No await between the check and the increment, so this is atomic on the event loop.
+        if self.active >= self.limit:
+            raise too_many(self.name, self.retry_after)
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+
+
+limiter = RateLimiter(RedisLimiterStore(RATE_LIMIT_URL) if RATE_LIMIT_URL else LocalLimiterStore())
+write_slots = ConcurrencyLimit("writes", WRITE_CONCURRENCY)
+bulk_slots = ConcurrencyLimit("bulk", BULK_CONCURRENCY)
@@ -0,0 +1,131 @@
+from datetime import date, datetime, timedelta, timezone
+from dateutil import tz as dateutil_tz
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from utils.settings import get_settings
+
+# Zone for users who never chose one; unset means the server's own clock, as before.
+DEFAULT_TIMEZONE = get_settings().default_timezone
+
+
+def valid_timezone(name):
+    try:
+        ZoneInfo(name)
+        return True
+    except (ZoneInfoNotFoundError, TypeError, ValueError):
+        return False
+
+
+def zone(name=None):
+    """tzinfo for an IANA name; falls back to DEFAULT_TIMEZONE, then to the server's local zone."""
+    for candidate in (name, DEFAULT_TIMEZONE):
+        if candidate and valid_timezone(candidate):
+            return ZoneInfo(candidate)
+    return dateutil_tz.tzlocal()
+
+
+def parse_times(times):
+    parsed = set()
+    for t in times or []:
+        try:
+            hh, mm = [int(x) for x in t.split(":")]
+        except (AttributeError, ValueError):
+            continue
+        if 0 <= hh < 24 and 0 <= mm < 60:
+            parsed.add((hh, mm))
+    return sorted(parsed)
+
+
+def floor_minute(dt):
+    return dt.replace(second=0, microsecond=0)
+
+
+def _local_to_utc(day, hh, mm, tz):
+    # A time inside a spring-forward gap fires when the gap ends; a repeated time fires the first time round.
+    local = datetime(day.year, day.month, day.day, hh, mm, tzinfo=tz)
+    while not dateutil_tz.datetime_exists(local):
+        local += timedelta(minutes=1)
+    return local.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def next_fire_at(med, after):
+    """First dose instant (naive UTC) at or after `after`, or None once the course is over.
+
+    `times` are wall-clock times in the medicine's `timezone`, copied from its owner.
+    """
+    times = parse_times(med.get("times"))
+    if not times:
+        return None
+    try:
+        start = date.fromisoformat(med["start_date"])
+        end = date.fromisoformat(med["end_date"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+    tz = zone(med.get("timezone"))
+    after_local = after.replace(tzinfo=timezone.utc).astimezone(tz).date()
+    day = max(start, after_local - timedelta(days=1))
+    while day <= end:
+        for hh, mm in times:
+            at = _local_to_utc(day, hh, mm, tz)
+            if at >= after:
+                return at
+        day += timedelta(days=1)
+    return None
+
+
+def rezone(med, name, now):
+    """$set for moving a medicine to the zone `name`: its times keep their wall-clock meaning."""
+    return {"timezone": name, "next_fire_at": next_fire_at({**med, "timezone": name}, now)}
+
+
+def local_hhmm(instant, name=None):
+    return instant.replace(tzinfo=timezone.utc).astimezone(zone(name)).strftime("%H:%M")
+
+
+def _localize(doses, start, end, tz):
+    import numpy as np
+    import pandas as pd
+
+    # One local day either side of the window covers any UTC offset.
+    first = pd.Timestamp(start).tz_localize("UTC").tz_convert(tz).tz_localize(None).normalize() - pd.Timedelta(days=1)
+    last = pd.Timestamp(end).tz_localize("UTC").tz_convert(tz).tz_localize(None).normalize() + pd.Timedelta(days=1)
+    days = pd.date_range(first, last, freq="D").values
+
+    med = np.repeat(doses["med"].to_numpy(), len(days))
+    day = np.tile(days, len(doses))
+    in_course = (day >= np.repeat(doses["start_date"].to_numpy(), len(days))) & \
+                (day <= np.repeat(doses["end_date"].to_numpy(), len(days)))
+    local = day + np.repeat(doses["minute"].to_numpy(), len(days)).astype("timedelta64[m]")
+    med, local = med[in_course], local[in_course]
+
+    # Same rules as _local_to_utc: a skipped time moves forward, a repeated time takes its first occurrence.
+    at = pd.DatetimeIndex(local).tz_localize(tz, ambiguous=np.ones(len(local), dtype=bool),
+                                             nonexistent="shift_forward")
+    return pd.DataFrame({"med": med, "at": at.tz_convert("UTC").tz_localize(None), "local": local})
+
+
+def expand_doses(meds, start, end):
+    """Every dose instant in [start, end) (naive UTC) for `meds`, as a DataFrame sorted by `at`.
+
+    Columns: `med` (position in `meds`), `at` (naive UTC) and `local` (wall clock in the
+    medicine's zone). The work is array operations over all medicines of a zone at once.
+    """
+    import pandas as pd
+
+    empty = pd.DataFrame({"med": pd.Series(dtype="int64"), "at": pd.Series(dtype="datetime64[ns]"),
+                          "local": pd.Series(dtype="datetime64[ns]")})
+    # parse_times is what next_fire_at fires on, so both agree on which strings are doses.
+    frame = pd.DataFrame({
+        "minute": [[hh * 60 + mm for hh, mm in parse_times(m.get("times"))] for m in meds],
+        "zone": [m.get("timezone") or "" for m in meds],
+        "start_date": pd.to_datetime([m.get("start_date") for m in meds], errors="coerce", format="%Y-%m-%d"),
+        "end_date": pd.to_datetime([m.get("end_date") for m in meds], errors="coerce", format="%Y-%m-%d"),
+    }).rename_axis("med").reset_index()
+    doses = frame.explode("minute").dropna(subset=["minute", "start_date", "end_date"])
+    if doses.empty or end <= start:
+        return empty
+    doses = doses.astype({"minute": "int64"})
+
+    out = pd.concat([_localize(group, start, end, zone(name)) for name, group in doses.groupby("zone")])
+    out = out[(out["at"] >= pd.Timestamp(start)) & (out["at"] < pd.Timestamp(end))]
+    return out.sort_values(["at", "med"], kind="stable").reset_index(drop=True)
@@ -0,0 +1,122 @@
+from dotenv import load_dotenv
+from functools import lru_cache
+import os
+
+
+def _int(name, default):
+    return int(os.getenv(name, default))
+
+
+def _optional_int(name):
+    value = os.getenv(name, "").strip()
+    return int(value) if value else None
+
+
+def _flag(name, default):
+    return os.getenv(name, default).lower() == "true"
+
+
+def _csv(name):
+    return [v.strip() for v in os.getenv(name, "").split(",") if v.strip()]
+
+
+class Settings:
+    """Process configuration, read from the environment once by `get_settings()`.
+
+    Modules take their tunables from here rather than from os.getenv, so .env is loaded
+    before any of them is read, whatever order they are imported in.
+    """
+
+    def __init__(self):
+        self.mongo_url = os.getenv("MONGO_URL")
+        self.db_name = os.getenv("DB_NAME", "medical_app")
+        # Pool and timeout knobs are passed straight to the Motor client.
+        self.mongo_max_pool_size = _int("MONGO_MAX_POOL_SIZE", 100)
+        self.mongo_min_pool_size = _int("MONGO_MIN_POOL_SIZE", 0)
+        self.mongo_max_idle_ms = _optional_int("MONGO_MAX_IDLE_MS")
+        self.mongo_wait_queue_timeout_ms = _optional_int("MONGO_WAIT_QUEUE_TIMEOUT_MS")
+        self.mongo_server_selection_timeout_ms = _int("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000)
+        self.mongo_connect_timeout_ms = _int("MONGO_CONNECT_TIMEOUT_MS", 10000)
+        self.mongo_socket_timeout_ms = _optional_int("MONGO_SOCKET_TIMEOUT_MS")
+        # e.g. "zstd,zlib"; unset sends uncompressed. zstd/snappy need their optional packages.
+        self.mongo_compressors = os.getenv("MONGO_COMPRESSORS", "").strip()
+        self.ready_timeout = float(os.getenv("READY_TIMEOUT_SECONDS", 2))
+
+        self.secret_key = os.getenv("SECRET_KEY", "secret")
+        self.bcrypt_rounds = _int("BCRYPT_ROUNDS", 12)
+        self.password_workers = _int("PASSWORD_WORKERS", os.cpu_count() or 2)
+        self.token_cache_size = _int("TOKEN_CACHE_SIZE", 1024)
+        self.admin_emails = {e.lower() for e in _csv("ADMIN_EMAILS")}
+
+        self.auth_ip_rate = float(os.getenv("AUTH_IP_RATE_PER_MINUTE", 20))
+        self.auth_ip_burst = _int("AUTH_IP_BURST", 10)
+        self.auth_email_rate = float(os.getenv("AUTH_EMAIL_RATE_PER_MINUTE", 5))
+        self.auth_email_burst = _int("AUTH_EMAIL_BURST", 5)
+        self.write_concurrency = _int("WRITE_CONCURRENCY", 64)
+        self.bulk_concurrency = _int("BULK_CONCURRENCY", 4)
+        self.rate_limit_keys = _int("RATE_LIMIT_KEYS", 65536)
+        self.rate_limit_url = os.getenv("RATE_LIMIT_URL", "")
+        self.rate_limit_trust_forwarded = _flag("RATE_LIMIT_TRUST_FORWARDED", "false")
+
+        self.response_cache_ttl = _int("RESPONSE_CACHE_TTL", 60)
+        self.response_cache_size = _int("RESPONSE_CACHE_SIZE", 4096)
+        self.response_cache_url = os.getenv("RESPONSE_CACHE_URL", "")
+        self.user_cache_size = _int("USER_CACHE_SIZE", 2048)
+        self.user_cache_ttl = _int("USER_CACHE_TTL", 300)
+
+        self.default_timezone = os.getenv("DEFAULT_TIMEZONE", "")
+        self.reminder_shards = _int("REMINDER_SHARDS", 8)
+        self.reminder_lease_seconds = _int("REMINDER_LEASE_SECONDS", 30)
+        self.reminder_deliver_seconds = _int("REMINDER_DELIVER_SECONDS", 10)
+        self.reminder_catchup_hours = _int("REMINDER_CATCHUP_HOURS", 24)
+        self.outbox_max_attempts = _int("OUTBOX_MAX_ATTEMPTS", 6)
+        self.outbox_backoff_base = _int("OUTBOX_BACKOFF_BASE", 30)
+        self.outbox_backoff_max = _int("OUTBOX_BACKOFF_MAX", 3600)
+        self.notification_retention_days = _int("NOTIFICATION_RETENTION_DAYS", 30)
+        self.notification_toast_limit = _int("NOTIFICATION_TOAST_LIMIT", 5)
+        self.adherence_retention_days = _int("ADHERENCE_RETENTION_DAYS", 400)
+
+        self.metrics_port = _int("METRICS_PORT", 0)
+        self.verify_query_plans = _flag("VERIFY_QUERY_PLANS", "false")
+
+        self.mail_server = os.getenv("MAIL_SERVER", "smtp.gmail.com")
+        self.mail_port = _int("MAIL_PORT", 587)
+        self.mail_username = os.getenv("MAIL_USERNAME")
+        self.mail_password = os.getenv("MAIL_PASSWORD")
+        self.mail_from = os.getenv("MAIL_FROM")
+        self.mail_starttls = _flag("MAIL_STARTTLS", "true")
+        self.mail_pool_size = _int("MAIL_POOL_SIZE", 4)
+
+        # The Streamlit app has its own database and mail account; STREAMLIT_DB_NAME keeps it
+        # apart from the backend's DB_NAME when both read one environment.
+        self.streamlit_mongo_uri = os.getenv("MONGO_URI", "").strip()
+        self.streamlit_db_name = os.getenv("STREAMLIT_DB_NAME") or os.getenv("DB_NAME", "medglow_db")
+        self.streamlit_mail_host = os.getenv("MAIL_HOST", "smtp.gmail.com")
+        self.streamlit_mail_user = os.getenv("MAIL_USER", "")
+        self.streamlit_mail_pass = os.getenv("MAIL_PASS", "")
+        self.streamlit_mail_from = os.getenv("MAIL_FROM") or self.streamlit_mail_user
+        # "inline" runs the reminder jobs inside the Streamlit process; "external" leaves them to worker.py.
+        self.streamlit_reminder_worker = os.getenv("REMINDER_WORKER", "inline").lower()
+        self.streamlit_data_cache_ttl = _int("DATA_CACHE_TTL", 300)
+        self.streamlit_notification_cache_ttl = _int("NOTIFICATION_CACHE_TTL", 60)
+
+    def mongo_options(self):
+        options = {
+            "maxPoolSize": self.mongo_max_pool_size,
+            "minPoolSize": self.mongo_min_pool_size,
+            "maxIdleTimeMS": self.mongo_max_idle_ms,
+            "waitQueueTimeoutMS": self.mongo_wait_queue_timeout_ms,
+            "serverSelectionTimeoutMS": self.mongo_server_selection_timeout_ms,
+            "connectTimeoutMS": self.mongo_connect_timeout_ms,
+            "socketTimeoutMS": self.mongo_socket_timeout_ms,
+        }
+        if self.mongo_compressors:
+            options["compressors"] = self.mongo_compressors
+        return {k: v for k, v in options.items() if v is not None}
+
+
+@lru_cache(maxsize=None)
+def get_settings():
+    # The one place .env is read; variables already in the environment win.
+    load_dotenv()
+    return Settings()
@@ -0,0 +1,43 @@
+from html import escape
+from string import Template
+
+# Parsed once at import; rendering an email is one substitute() call.
+REMINDER_SUBJECT = Template("MedGlow Reminder — $name")
+REMINDER_HTML = Template(
+    "<p>Hi $user,</p>"
+    "<p>This is a reminder to take your medicine:</p>"
+    "<h3>$name</h3>"
+    "<p><strong>Dosage:</strong> $dosage</p>"
+    "<p><strong>Time:</strong> $time</p>"
+    "<p>— MedGlow</p>"
+)
+DIGEST_SUBJECT = Template("MedGlow Reminder — $count medicines at $time")
+DIGEST_ROW = Template("<li><strong>$name</strong> — $dosage</li>")
+DIGEST_HTML = Template(
+    "<p>Hi $user,</p>"
+    "<p>It's $time — time to take these medicines:</p>"
+    "<ul>$rows</ul>"
+    "<p>— MedGlow</p>"
+)
+
+
+def _text(value):
+    return escape(str(value if value is not None else ""))
+
+
+def render_reminder(user, med, time_local):
+    """(subject, html) for a single dose."""
+    subject = REMINDER_SUBJECT.substitute(name=med.get("name") or "")
+    html = REMINDER_HTML.substitute(
+        user=_text(user.get("name")), name=_text(med.get("name")),
+        dosage=_text(med.get("dosage")), time=_text(time_local),
+    )
+    return subject, html
+
+
+def render_digest(user, meds, time_local):
+    """(subject, html) for every dose one user has due in the same minute."""
+    rows = "".join(DIGEST_ROW.substitute(name=_text(m.get("name")), dosage=_text(m.get("dosage"))) for m in meds)
+    subject = DIGEST_SUBJECT.substitute(count=len(meds), time=time_local)
+    html = DIGEST_HTML.substitute(user=_text(user.get("name")), time=_text(time_local), rows=rows)
+    return subject, html
@@ -0,0 +1,72 @@
+from collections import deque
+import contextvars
+import threading
+import time
+
+ROUTE_WINDOW = 1024
+
+# Spans of the request being served: name -> [seconds, calls]. The dict is shared, not copied,
+# so work on executor threads that inherit the context (Motor's does) adds to the same request.
+_spans = contextvars.ContextVar("request_spans", default=None)
+
+
+def begin():
+    spans = {}
+    _spans.set(spans)
+    return spans
+
+
+def add(name, seconds):
+    spans = _spans.get()
+    if spans is not None:
+        entry = spans.setdefault(name, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+
+class span:
+    """`with span("bcrypt"):` adds the block's wall time to the current request."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        add(self.name, time.perf_counter() - self.started)
+
+
+def server_timing(spans, total):
+    parts = [f'{name};dur={seconds * 1000:.1f};desc="{calls} call(s)"' for name, (seconds, calls) in spans.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+class RouteStats:
+    """Last ROUTE_WINDOW latencies per route, for quick percentiles without a metrics stack."""
+
+    def __init__(self, window=ROUTE_WINDOW):
+        self.window = window
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def record(self, route, seconds):
+        with self._lock:
+            self._data.setdefault(route, deque(maxlen=self.window)).append(seconds)
+
+    def percentiles(self):
+        with self._lock:
+            snapshot = {route: sorted(values) for route, values in self._data.items()}
+        return {
+            route: {
+                "count": len(values),
+                **{f"p{p}_ms": round(values[min(len(values) - 1, len(values) * p // 100)] * 1000, 2)
+                   for p in (50, 90, 99)},
+                "max_ms": round(values[-1] * 1000, 2),
+            }
+            for route, values in snapshot.items()
+        }
+
+
+route_stats = RouteStats()
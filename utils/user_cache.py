@@ -0,0 +1,90 @@
+from collections import OrderedDict
+import threading
+import time
+from utils.settings import get_settings
+
+# Only what a reminder needs; keeps password hashes out of the cache.
+USER_FIELDS = {"name": 1, "email": 1, "notification_pref": 1, "digest": 1, "timezone": 1, "prefs_version": 1}
+
+
+def prefs_update(update):
+    """`update` plus a bump of the user's prefs_version, for any write to USER_FIELDS.
+
+    Other processes' caches only see the change through the version, so invalidate() alone
+    is not enough.
+    """
+    return {**update, "$inc": {"prefs_version": 1}}
+
+
+class UserCache:
+    def __init__(self, maxsize=2048, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, ids):
+        found, missing = {}, []
+        now = time.monotonic()
+        with self._lock:
+            for uid in ids:
+                entry = self._data.get(uid)
+                if entry and entry[0] > now:
+                    self._data.move_to_end(uid)
+                    found[uid] = entry[1]
+                else:
+                    self._data.pop(uid, None)
+                    missing.append(uid)
+        return found, missing
+
+    def put(self, user):
+        with self._lock:
+            self._data[user["_id"]] = (time.monotonic() + self.ttl, user)
+            self._data.move_to_end(user["_id"])
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._data.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+user_cache = UserCache(
+    maxsize=get_settings().user_cache_size,
+    ttl=get_settings().user_cache_ttl,
+)
+
+
+def _due_ids(ids):
+    return list({uid for uid in ids if uid is not None})
+
+
+def _stale_query(found, missing):
+    # One read for the users not cached and the cached ones whose prefs_version has moved on.
+    clauses = [{"_id": {"$in": missing}}] if missing else []
+    clauses += [{"_id": uid, "prefs_version": {"$ne": user.get("prefs_version")}} for uid, user in found.items()]
+    return {"$or": clauses} if clauses else None
+
+
+async def resolve_users(collection, ids):
+    found, missing = user_cache.get_many(_due_ids(ids))
+    query = _stale_query(found, missing)
+    if query:
+        async for user in collection.find(query, USER_FIELDS):
+            user_cache.put(user)
+            found[user["_id"]] = user
+    return found
+
+
+def resolve_users_sync(collection, ids):
+    found, missing = user_cache.get_many(_due_ids(ids))
+    query = _stale_query(found, missing)
+    if query:
+        for user in collection.find(query, USER_FIELDS):
+            user_cache.put(user)
+            found[user["_id"]] = user
+    return found